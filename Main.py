@@ -1,16 +1,43 @@
+import argparse
+import time
 import traceback
+from typing import Optional, Tuple
 
 import tcod
 
 import color
 import exceptions
+from frame_stats import FrameTimeHistogram
 import input_handlers
+import instrumentation
 import setup_game
 
 
-def main() -> None:
+def screen_state(handler: input_handlers.BaseEventHandler) -> Tuple[object, ...]:
+    """То, от чего зависит картинка при движении мыши: активный обработчик и плитка под курсором."""
+    if isinstance(handler, input_handlers.EventHandler):
+        return handler, handler.engine.mouse_location
+    return (handler,)
+
+
+def save_game(handler: input_handlers.BaseEventHandler, filename: str) -> None:
+    """Если идет игра, сохраняет ее в файл."""
+    if isinstance(handler, input_handlers.EventHandler):
+        handler.engine.save_as(filename)
+        print("Game saved.")
+
+
+def main(fps: int = 60, frame_times: Optional[FrameTimeHistogram] = None) -> None:
+    """Главный цикл игры.
+
+    Экран перерисовывается только после событий, которые что-то поменяли, и не чаще
+    `fps` раз в секунду: события, пришедшие до начала следующего кадра, отрисовываются
+    одним кадром. Без событий цикл спит в tcod.event.wait. Если передан `frame_times`,
+    в него записывается время каждого кадра.
+    """
     screen_width = 100
     screen_height = 55
+    frame_budget = 1 / fps
 
 
     tileset = tcod.tileset.load_tilesheet(
@@ -28,17 +55,34 @@ def main() -> None:
         vsync=True,
     ) as context:
         root_console = tcod.Console(screen_width, screen_height, order="F")
+        redraw = True
+        next_frame = time.perf_counter()
         try:
             while True:
-                root_console.clear()
-                handler.on_render(console=root_console)
-                context.present(root_console)
+                # Экран перерисовывается, только если что-то изменилось и подошло время кадра.
+                if redraw and time.perf_counter() >= next_frame:
+                    frame_start = time.perf_counter()
+                    root_console.clear()
+                    handler.on_render(console=root_console)
+                    context.present(root_console)
+                    redraw = False
+                    next_frame = frame_start + frame_budget
+                    if frame_times:
+                        frame_times.record(time.perf_counter() - frame_start)
 
+                # Пока перерисовывать нечего, ждем событий без ограничения по времени,
+                # иначе - не дольше, чем до начала следующего кадра.
+                timeout = max(0.0, next_frame - time.perf_counter()) if redraw else None
                 try:
-                    for event in tcod.event.wait():
+                    for event in tcod.event.wait(timeout):
                         context.convert_event(event)
+                        state = screen_state(handler)
                         handler = handler.handle_events(event)
+                        # Движение мыши в пределах той же плитки ничего не меняет на экране.
+                        if not isinstance(event, tcod.event.MouseMotion) or screen_state(handler) != state:
+                            redraw = True
                 except Exception:  # Управляет исключениями в игре. 
+                    redraw = True
                     traceback.print_exc()  # Выводит ошибку в stderr.
                     # Затем печатает ошибку в журнале сообщений (message_log).
                     if isinstance(handler, input_handlers.EventHandler):
@@ -47,7 +91,32 @@ def main() -> None:
                         )
         except exceptions.QuitWithoutSaving:
             raise
+        except BaseException:  # Сохраняет игру при выходе (SystemExit) и при любой неожиданной ошибке.
+            save_game(handler, "savegame.sav")
+            raise
             
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Spaceship Defender.")
+    parser.add_argument("--fps", type=int, default=60, help="maximum frames per second")
+    parser.add_argument(
+        "--frame-stats", action="store_true", help="print a frame time histogram on exit"
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="FILE",
+        help="collect turn timings and write them to FILE (.json or .csv) on exit",
+    )
+    args = parser.parse_args()
+    if args.fps <= 0:
+        parser.error("--fps must be a positive number")
+    frame_times = FrameTimeHistogram() if args.frame_stats else None
+    if args.profile:
+        instrumentation.enable()
+    try:
+        main(args.fps, frame_times)
+    finally:
+        if frame_times:
+            print(frame_times.summary())
+        if args.profile:
+            instrumentation.dump(args.profile)
@@ -3,11 +3,12 @@ from __future__ import annotations
 from typing import Optional, Tuple, TYPE_CHECKING 
 
 import color
+from entity import Item
 import exceptions
 
 if TYPE_CHECKING:
    from engine import Engine
-   from entity import Actor, Entity, Item 
+   from entity import Actor, Entity 
    
 class Action:
     def __init__(self, entity: Actor) -> None: 
@@ -41,12 +42,12 @@ class PickupAction(Action):
        actor_location_y = self.entity.y
        inventory = self.entity.inventory
 
-       for item in self.engine.game_map.items:
-           if actor_location_x == item.x and actor_location_y == item.y:
+       for item in self.engine.game_map.get_entities_at_location(actor_location_x, actor_location_y):
+           if isinstance(item, Item):
                if len(inventory.items) >= inventory.capacity:
                    raise exceptions.Impossible("Your inventory is full.")
 
-               self.engine.game_map.entities.remove(item)
+               self.engine.game_map.remove_entity(item)
                item.parent = self.entity.inventory
                inventory.items.append(item)
 
@@ -86,11 +87,24 @@ class TakeStairsAction(Action):
         """
         Пользуется лестницей, если она есть на координатах, где стоит персонаж.
         """
-        if (self.entity.x, self.entity.y) == self.engine.game_map.downstairs_location:
+        location = (self.entity.x, self.entity.y)
+        if location == self.engine.game_map.downstairs_location:
             self.engine.game_world.generate_floor()
             self.engine.message_log.add_message(
                 "You descend the staircase.", color.descend
             )
+            if self.engine.autosaver:
+                self.engine.autosaver.request_save()
+        elif (
+            location == self.engine.game_map.upstairs_location
+            and self.engine.game_world.current_floor > 1
+        ):
+            self.engine.game_world.ascend()
+            self.engine.message_log.add_message(
+                "You ascend the staircase.", color.descend
+            )
+            if self.engine.autosaver:
+                self.engine.autosaver.request_save()
         else:
             raise exceptions.Impossible("There are no stairs here.")
 
@@ -136,7 +150,7 @@ class MeleeAction(ActionWithDirection):  #выводит сообщение, е
           self.engine.message_log.add_message(
                 f"{attack_desc} for {damage} hit points.", attack_color
             )
-          target.fighter.hp -= damage
+          target.fighter.take_damage(damage, source=self.entity.name)
        else:
           self.engine.message_log.add_message(
                 f"{attack_desc} but does no damage.", attack_color
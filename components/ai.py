@@ -1,13 +1,12 @@
 # в этом файле лежит "искусственный интеллект", который обеспечивает способность монстров преследовать героя
 from __future__ import annotations
 
-import random
 from typing import List, Optional, Tuple, TYPE_CHECKING
 
-import numpy as np  # type: ignore
 import tcod
 
 from actions import Action, BumpAction, MeleeAction, MovementAction, WaitAction
+import instrumentation
 
 if TYPE_CHECKING:
     from entity import Actor
@@ -19,22 +18,14 @@ class BaseAI(Action):
     def perform(self) -> None:
         raise NotImplementedError()
 
+    @instrumentation.timed("ai.get_path_to")
     def get_path_to(self, dest_x: int, dest_y: int) -> List[Tuple[int, int]]:
         """Compute and return a path to the target position.
 
         If there is no valid path then returns an empty list.
         """
-        # Copy the walkable array.
-        cost = np.array(self.entity.gamemap.tiles["walkable"], dtype=np.int8)
-
-        for entity in self.entity.gamemap.entities:
-            # Check that an enitiy blocks movement and the cost isn't zero (blocking.)
-            if entity.blocks_movement and cost[entity.x, entity.y]:
-                # Add to the cost of a blocked position.
-                # A lower number means more enemies will crowd behind each other in
-                # hallways.  A higher number means enemies will take longer paths in
-                # order to surround the player.
-                cost[entity.x, entity.y] += 10
+        # Общий массив стоимости карты (только для чтения), с учетом блокирующих объектов.
+        cost = self.entity.gamemap.cost
 
         # Create a graph from the cost array and pass that graph to a new pathfinder.
         graph = tcod.path.SimpleGraph(cost=cost, cardinal=2, diagonal=3)
@@ -48,6 +39,16 @@ class BaseAI(Action):
         # Convert from List[List[int]] to List[Tuple[int, int]].
         return [(index[0], index[1]) for index in path]
 
+    @instrumentation.timed("ai.get_path_to_player")
+    def get_path_to_player(self) -> List[Tuple[int, int]]:
+        """Возвращает путь к игроку по общему полю расстояний (Engine.player_pathfinder).
+
+        Если пути нет, возвращает пустой список.
+        """
+        pathfinder = self.engine.player_pathfinder
+        path: List[List[int]] = pathfinder.path_from((self.entity.x, self.entity.y))[1:].tolist()
+        return [(index[0], index[1]) for index in path]
+
 class HostileEnemy(BaseAI):
    def __init__(self, entity: Actor):
        super().__init__(entity)
@@ -63,7 +64,7 @@ class HostileEnemy(BaseAI):
            if distance <= 1:
                return MeleeAction(self.entity, dx, dy).perform()
 
-           self.path = self.get_path_to(target.x, target.y)
+           self.path = self.get_path_to_player()
 
        if self.path:
            dest_x, dest_y = self.path.pop(0)
@@ -1,14 +1,18 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+import copy
+from typing import TypeVar, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from engine import Engine
     from entity import Entity
     from game_map import GameMap
 
+T = TypeVar("T", bound="BaseComponent")
+
 
 class BaseComponent:
+    __slots__ = ("parent",)
     parent: Entity  # Обладает экземпляром объекта
 
     @property
@@ -18,3 +22,11 @@ class BaseComponent:
     @property
     def engine(self) -> Engine:
         return self.gamemap.engine
+
+    def clone(self: T) -> T:
+        """Копия компонента для нового объекта (parent назначит новый владелец).
+
+        Поверхностной копии достаточно для компонентов из простых значений;
+        компоненты с изменяемыми полями переопределяют этот метод.
+        """
+        return copy.copy(self)
@@ -5,6 +5,7 @@ from typing import Optional, TYPE_CHECKING
 import actions
 import color
 import components.ai
+import components.fighter
 import components.inventory
 from components.base_component import BaseComponent
 from exceptions import Impossible
@@ -15,6 +16,7 @@ if TYPE_CHECKING:
 
 
 class Consumable(BaseComponent):
+    __slots__ = ()
     parent: Item
 
     def get_action(self, consumer: Actor) -> Optional[ActionOrHandler]:
@@ -36,6 +38,8 @@ class Consumable(BaseComponent):
             inventory.items.remove(entity)
 
 class HealingConsumable(Consumable):
+    __slots__ = ("amount",)
+
     def __init__(self, amount: int):
         self.amount = amount
 
@@ -53,6 +57,8 @@ class HealingConsumable(Consumable):
             raise Impossible(f"Your health is already full.")
 
 class BombDamageConsumable(Consumable):
+   __slots__ = ("damage", "radius")
+
    def __init__(self, damage: int, radius: int):
        self.damage = damage
        self.radius = radius
@@ -73,47 +79,43 @@ class BombDamageConsumable(Consumable):
        if not self.engine.game_map.visible[target_xy]:
            raise Impossible("You cannot target an area that you cannot see.")
 
-       targets_hit = False
-       for actor in self.engine.game_map.actors:
-           if actor.distance(*target_xy) <= self.radius:
-               self.engine.message_log.add_message(
-                   f"The {actor.name} is engulfed in a fiery explosion, taking {self.damage} damage!"
-               )
-               actor.fighter.take_damage(self.damage)
-               targets_hit = True
-
-       if not targets_hit:
+       targets = self.engine.game_map.get_actors_in_radius(*target_xy, self.radius)
+       if not targets:
            raise Impossible("There are no targets in the radius.")
+
+       for actor in targets:
+           self.engine.message_log.add_message(
+               f"The {actor.name} is engulfed in a fiery explosion, taking {self.damage} damage!"
+           )
+       components.fighter.Fighter.take_damage_batch(targets, self.damage, source=self.parent.name)
        self.consume()
 
 class GunDamageConsumable(Consumable):
+   __slots__ = ("damage", "maximum_range")
+
    def __init__(self, damage: int, maximum_range: int):
        self.damage = damage
        self.maximum_range = maximum_range
 
    def activate(self, action: actions.ItemAction) -> None:
        consumer = action.entity
-       target = None
-       closest_distance = self.maximum_range + 1.0
-
-       for actor in self.engine.game_map.actors:
-           if actor is not consumer and self.parent.gamemap.visible[actor.x, actor.y]:
-               distance = consumer.distance(actor.x, actor.y)
-
-               if distance < closest_distance:
-                   target = actor
-                   closest_distance = distance
+       # Цель - ближайший видимый враг на расстоянии меньше maximum_range + 1.
+       target = consumer.gamemap.get_nearest_actor(
+           consumer.x, consumer.y, self.maximum_range + 1, exclude=consumer, strict=True
+       )
 
        if target:
            self.engine.message_log.add_message(
                f"A space gun strikes the {target.name} with a terrible sound, for {self.damage} damage!"
            )
-           target.fighter.take_damage(self.damage)
+           target.fighter.take_damage(self.damage, source=self.parent.name)
            self.consume()
        else:
            raise Impossible("No enemy is close enough to strike.")
 
 class KeyConsumable(Consumable):
+    __slots__ = ("amount",)
+
     def __init__(self, amount: int):
         self.amount = amount
 
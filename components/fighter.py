@@ -1,5 +1,7 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING
+from typing import Optional, Sequence, TYPE_CHECKING
+
+import numpy as np  # type: ignore
 
 import color
 from components.base_component import BaseComponent
@@ -10,6 +12,7 @@ if TYPE_CHECKING:
 
 
 class Fighter(BaseComponent):
+    __slots__ = ("max_hp", "_hp", "defense", "power", "last_damage_source", "cause_of_death")
     parent: Actor
     
     def __init__(self, hp: int, defense: int, power: int):
@@ -17,6 +20,15 @@ class Fighter(BaseComponent):
         self._hp = hp
         self.defense = defense # defence - насолько будет уменьшен причиненный ущерб
         self.power = power # power - сила атаки
+        self.last_damage_source: Optional[str] = None # кто или что нанес последний урон
+        self.cause_of_death: Optional[str] = None # заполняется в die()
+
+    def clone(self) -> Fighter:
+        clone = Fighter(hp=self.max_hp, defense=self.defense, power=self.power)
+        clone._hp = self._hp
+        clone.last_damage_source = self.last_damage_source
+        clone.cause_of_death = self.cause_of_death
+        return clone
 
     @property
     def hp(self) -> int:
@@ -27,6 +39,8 @@ class Fighter(BaseComponent):
         self._hp = max(0, min(value, self.max_hp))
         if self._hp == 0 and self.parent.ai:
             self.die()
+        elif self.parent.is_on_map:
+            self.gamemap.update_entity(self.parent)
 
     def die(self) -> None:
         if self.engine.player is self.parent:
@@ -35,7 +49,9 @@ class Fighter(BaseComponent):
         else:
             death_message = f"{self.parent.name} is dead!"
             death_message_color = color.enemy_die
+            self.engine.kill_count += 1
             
+        self.cause_of_death = self.last_damage_source or "unknown"
 
         self.parent.char = "%"
         self.parent.color = (152, 152, 152)
@@ -43,6 +59,7 @@ class Fighter(BaseComponent):
         self.parent.ai = None
         self.parent.name = f"remains of {self.parent.name}"
         self.parent.render_order = RenderOrder.CORPSE 
+        self.gamemap.update_entity(self.parent)
 
         self.engine.message_log.add_message(death_message, death_message_color)
 
@@ -61,5 +78,29 @@ class Fighter(BaseComponent):
 
         return amount_recovered
 
-    def take_damage(self, amount: int) -> None:
+    def take_damage(self, amount: int, source: Optional[str] = None) -> None:
+        """Наносит урон; `source` - имя атакующего или предмета (для статистики смертей)."""
+        if source:
+            self.last_damage_source = source
         self.hp -= amount
+
+    @staticmethod
+    def take_damage_batch(actors: Sequence[Actor], amount: int, source: Optional[str] = None) -> None:
+        """Наносит `amount` урона сразу нескольким живым actors одной карты.
+
+        Новые hp считаются одним вычитанием по столбцу hp в entity_store карты, затем
+        переносятся в компоненты; для погибших вызывается die(), как в take_damage.
+        """
+        if not actors:
+            return
+        store = actors[0].gamemap.entity_store
+        ids = np.array([actor.entity_id for actor in actors], dtype=np.intp)
+        new_hp = np.maximum(store.hp[ids] - amount, 0)
+        store.hp[ids] = new_hp
+        for actor, hp in zip(actors, new_hp.tolist()):
+            fighter = actor.fighter
+            if source:
+                fighter.last_damage_source = source
+            fighter._hp = hp
+            if hp == 0:
+                fighter.die()
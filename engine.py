@@ -3,19 +3,27 @@
 # в том числе файл нужен, чтобы разгрузить main
 
 from __future__ import annotations 
-from typing import TYPE_CHECKING 
-
+from typing import Optional, Tuple, TYPE_CHECKING 
 
+import numpy as np  # type: ignore
 from tcod.console import Console
 from tcod.map import compute_fov
+import tcod
 
 import exceptions
+import instrumentation
 from message_log import MessageLog
 import render_functions
 
 if TYPE_CHECKING: 
     from entity import Actor 
     from game_map import GameMap, GameWorld
+    from savegame import Autosaver
+
+
+FOV_RADIUS = 8 # радиус поля зрения героя
+VIEWPORT_WIDTH = 100 # сколько плиток карты помещается на экране
+VIEWPORT_HEIGHT = 46 # (ниже карты - журнал сообщений и шкала здоровья)
 
 
 class Engine:
@@ -26,28 +34,131 @@ class Engine:
         self.message_log = MessageLog()
         self.mouse_location = (0, 0) # здесь ханится информация о местонахождении мыши
         self.player = player
-
+        self.kill_count = 0 # сколько врагов погибло за партию
+        self.autosaver: Optional[Autosaver] = None # только в игре с окном, не в simulation
+        self.show_profiler = False # оверлей с замерами instrumentation (клавиша F3)
+        self._player_pathfinder: Optional[tcod.path.Pathfinder] = None
+        # Окно последнего расчета FOV: (карта, позиция героя, (x1, y1, x2, y2), прозрачность окна).
+        self._fov_window: Optional[
+            Tuple[GameMap, Tuple[int, int], Tuple[int, int, int, int], np.ndarray]
+        ] = None
+
+    @instrumentation.timed("engine.handle_enemy_turns")
     def handle_enemy_turns(self) -> None:
-        for entity in set(self.game_map.actors) - {self.player}: 
+        self._player_pathfinder = None  # Поле расстояний до игрока строится заново на каждый ход.
+        for entity in [actor for actor in self.game_map.actors if actor is not self.player]: 
             if entity.ai:
+                instrumentation.count("ai.perform")
                 try:
                     entity.ai.perform()
                 except exceptions.Impossible:
                     pass  # Игнорирует исключения, возникающие из-за невозможных действий AI.
-
+        self._player_pathfinder = None
+
+    @property
+    def player_pathfinder(self) -> tcod.path.Pathfinder:
+        """Общее для всех врагов поле расстояний до игрока (один алгоритм Дейкстры за ход).
+
+        Создается при первом обращении во время хода врагов, а считается лениво:
+        `path_from` сам дорешивает поле до клетки врага, так что на большой карте
+        оно разрастается только до самого дальнего врага, которому нужен путь.
+        """
+        if self._player_pathfinder is None:
+            with instrumentation.timer("engine.player_pathfinder"):
+                graph = tcod.path.SimpleGraph(cost=self.game_map.cost, cardinal=2, diagonal=3)
+                pathfinder = tcod.path.Pathfinder(graph)
+                pathfinder.add_root((self.player.x, self.player.y))
+                self._player_pathfinder = pathfinder
+        return self._player_pathfinder
+
+    @instrumentation.timed("engine.update_fov")
     def update_fov(self) -> None:
-        """Пересчитывает видимую область на основе местонахождения героя."""
-        self.game_map.visible[:] = compute_fov(
-            self.game_map.tiles["transparent"],
-            (self.player.x, self.player.y),
-            radius=8, # радиус отвечает за то, насколько обширным будет поле зрения
+        """Пересчитывает видимую область на основе местонахождения героя.
+
+        Поле зрения ограничено радиусом, поэтому оно считается только в окне
+        (2 * FOV_RADIUS + 1) вокруг героя, а в visible переписываются только
+        это окно и окно с прошлого хода. Если герой не сдвинулся и прозрачность
+        плиток в окне не поменялась, пересчет пропускается.
+        """
+        game_map = self.game_map
+        x, y = self.player.x, self.player.y
+        x1, y1 = max(0, x - FOV_RADIUS), max(0, y - FOV_RADIUS)
+        x2 = min(game_map.width, x + FOV_RADIUS + 1)
+        y2 = min(game_map.height, y + FOV_RADIUS + 1)
+        transparent = game_map.tiles["transparent"][x1:x2, y1:y2]
+
+        previous = self._fov_window
+        if previous is not None and previous[0] is not game_map:
+            previous = None  # Этаж сменился, прошлое окно относится к другой карте.
+        if (
+            previous is not None
+            and previous[1] == (x, y)
+            and np.array_equal(previous[3], transparent)
+        ):
+            return
+
+        visible = compute_fov(
+            np.ascontiguousarray(transparent),
+            (x - x1, y - y1),
+            radius=FOV_RADIUS, # радиус отвечает за то, насколько обширным будет поле зрения
         )
-        # Если плитка - "visible", она должны быть добавлена к "explored".
-        self.game_map.explored |= self.game_map.visible # добавляет увиденные плитки к исследованным
-        #(любая плитка, которая была увидена, автоматически считается исследованной)
+
+        if previous is None:
+            if game_map.visible.any():
+                # Карта уже была видна раньше (например, при возвращении на этаж):
+                # один раз гасим всю старую видимость.
+                game_map.update_visible(0, 0, np.zeros_like(game_map.visible))
+        else:
+            # Старое окно гасится, кроме пересечения с новым.
+            px1, py1, px2, py2 = previous[2]
+            old_window = np.zeros((px2 - px1, py2 - py1), dtype=bool)
+            ox1, oy1 = max(x1, px1), max(y1, py1)
+            ox2, oy2 = min(x2, px2), min(y2, py2)
+            if ox1 < ox2 and oy1 < oy2:
+                old_window[ox1 - px1 : ox2 - px1, oy1 - py1 : oy2 - py1] = visible[
+                    ox1 - x1 : ox2 - x1, oy1 - y1 : oy2 - y1
+                ]
+            game_map.update_visible(px1, py1, old_window)
+
+        game_map.update_visible(x1, y1, visible)
+        self._fov_window = (game_map, (x, y), (x1, y1, x2, y2), transparent.copy())
+
+    @property
+    def viewport(self) -> Tuple[int, int, int, int]:
+        """Часть карты на экране: (x, y, ширина, высота) в координатах карты.
+
+        Камера держит героя в центре экрана, но не заходит за края карты; карта
+        меньше экрана рисуется целиком.
+        """
+        game_map = self.game_map
+        width = min(VIEWPORT_WIDTH, game_map.width)
+        height = min(VIEWPORT_HEIGHT, game_map.height)
+        x = max(0, min(self.player.x - width // 2, game_map.width - width))
+        y = max(0, min(self.player.y - height // 2, game_map.height - height))
+        return x, y, width, height
+
+    def screen_to_map(self, x: int, y: int) -> Optional[Tuple[int, int]]:
+        """Плитка карты под плиткой экрана (x, y) или None, если там не карта."""
+        view_x, view_y, width, height = self.viewport
+        if 0 <= x < width and 0 <= y < height:
+            return view_x + x, view_y + y
+        return None
+
+    def map_to_screen(self, x: int, y: int) -> Tuple[int, int]:
+        """Плитка экрана, на которой нарисована плитка карты (x, y)."""
+        view_x, view_y, _, _ = self.viewport
+        return x - view_x, y - view_y
+
+    def save_as(self, filename: str) -> None:
+        """Сохраняет партию в файл (формат описан в savegame)."""
+        import savegame
+
+        if self.autosaver:
+            self.autosaver.wait()  # Иначе фоновая запись может перезаписать этот файл.
+        savegame.save(self, filename)
 
     def render(self, console: Console) -> None:
-        self.game_map.render(console)
+        self.game_map.render(console, self.viewport)
 
         self.message_log.render(console=console, x=21, y=47, width=45, height=7)
 
@@ -71,4 +182,7 @@ class Engine:
             console=console, location=(68, 47)
         )
 
+        if self.show_profiler:
+            render_functions.render_profiler(console=console, location=(console.width - 56, 0))
+
 # render управляет отрисовкой экрана, объектов, шкалы
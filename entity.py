@@ -1,7 +1,6 @@
  # файл для 
 from __future__ import annotations
 
-import copy
 import math
 from typing import Optional, Tuple, Type, TypeVar, TYPE_CHECKING, Union
 from render_order import RenderOrder 
@@ -18,6 +17,10 @@ T = TypeVar("T", bound="Entity")
 
 class Entity:
     """ Класс для всех возможных объектов игры (для игроков, врагов, предметов etc.) """
+    # __slots__ вместо __dict__: объектов на этаже могут быть десятки тысяч.
+    __slots__ = (
+        "x", "y", "char", "color", "name", "blocks_movement", "render_order", "entity_id", "parent",
+    )
     parent: Union[GameMap, Inventory]
     def __init__(   
         self,
@@ -37,10 +40,11 @@ class Entity:
         self.name = name
         self.blocks_movement = blocks_movement
         self.render_order = render_order 
+        self.entity_id = 0 # id на текущей карте, выдается GameMap.add_entity
         if parent:
             # Если parent не представлен сейчас, то он будет предоставлен позже.
             self.parent = parent
-            parent.entities.add(self) 
+            parent.add_entity(self) 
     
 # x, y - координаты объекта на карте
 # char - отражение объекта (e.g. для игрока это @)
@@ -52,25 +56,49 @@ class Entity:
     def gamemap(self) -> GameMap:
         return self.parent.gamemap
 
+    def clone(self: T) -> T:
+        """Возвращает копию объекта без привязки к карте.
+
+        Копируются только данные объекта и его компоненты (через их clone()),
+        а не весь граф объектов, как в copy.deepcopy.
+        """
+        return Entity(
+            x=self.x,
+            y=self.y,
+            char=self.char,
+            color=self.color,
+            name=self.name,
+            blocks_movement=self.blocks_movement,
+            render_order=self.render_order,
+        )
+
     def spawn(self: T, gamemap: GameMap, x: int, y: int) -> T:
         """создает копию существа из GameMap в данной локации"""
-        clone = copy.deepcopy(self)
+        clone = self.clone()
         clone.x = x
         clone.y = y
         clone.parent = gamemap 
-        gamemap.entities.add(clone)
+        gamemap.add_entity(clone)
         return clone
 
+    @property
+    def is_on_map(self) -> bool:
+        """True, если объект лежит прямо на карте (а не, например, в инвентаре)."""
+        return hasattr(self, "parent") and self.parent is self.gamemap
+
     def place(self, x: int, y: int, gamemap: Optional[GameMap] = None) -> None: 
         """Размещает объект в новом месте.  Управляет передвижением по карте."""
-        self.x = x
-        self.y = y
         if gamemap:
-            if hasattr(self, "parent"):  # Parent возможно не инициализирован.
-                if self.parent is self.gamemap:
-                    self.gamemap.entities.remove(self)
+            if self.is_on_map and self.parent is not gamemap:  # Parent возможно не инициализирован.
+                self.gamemap.remove_entity(self)
             self.parent = gamemap
-            gamemap.entities.add(self)
+        if self.is_on_map and self in self.gamemap.entities:
+            self.gamemap.move_entity(self, x, y)
+        else:
+            self.x = x
+            self.y = y
+            if gamemap:
+                gamemap.add_entity(self)
 
     def distance(self, x: int, y: int) -> float:
         """
@@ -80,11 +108,16 @@ class Entity:
 
     def move(self, dx: int, dy: int) -> None:
         # Переместить объект на заданную величину:
-        self.x += dx
-        self.y += dy
+        if self.is_on_map:
+            self.gamemap.move_entity(self, self.x + dx, self.y + dy)
+        else:
+            self.x += dx
+            self.y += dy
     # функция move изменяет позицию объекта
 
 class Actor(Entity): # actor - герой/монстр
+   __slots__ = ("ai", "fighter", "inventory")
+
    def __init__(
        self,
        *,
@@ -115,12 +148,38 @@ class Actor(Entity): # actor - герой/монстр
        self.inventory = inventory
        self.inventory.parent = self
 
+   def clone(self) -> Actor:
+       """Копия с новыми компонентами; AI создается заново (без запомненного пути)."""
+       if self.ai:
+           ai_cls = type(self.ai)
+       else:
+           from components.ai import BaseAI  # здесь, чтобы не было циклического импорта
+
+           ai_cls = BaseAI
+       clone = Actor(
+           x=self.x,
+           y=self.y,
+           char=self.char,
+           color=self.color,
+           name=self.name,
+           ai_cls=ai_cls,
+           fighter=self.fighter.clone(),
+           inventory=self.inventory.clone(),
+       )
+       if not self.ai:
+           clone.ai = None
+       clone.blocks_movement = self.blocks_movement
+       clone.render_order = self.render_order
+       return clone
+
    @property
    def is_alive(self) -> bool:
        """Возвращает True, если actor может совершать действия."""
        return bool(self.ai)
 
 class Item(Entity): # item - аптечка или оружие
+   __slots__ = ("consumable",)
+
    def __init__(
        self,
        *,
@@ -143,3 +202,13 @@ class Item(Entity): # item - аптечка или оружие
 
        self.consumable = consumable
        self.consumable.parent = self
+
+   def clone(self) -> Item:
+       return Item(
+           x=self.x,
+           y=self.y,
+           char=self.char,
+           color=self.color,
+           name=self.name,
+           consumable=self.consumable.clone(),
+       )
@@ -0,0 +1,81 @@
+# хранилище состояния объектов карты в массивах NumPy (struct of arrays)
+from __future__ import annotations
+
+from typing import List, Optional, TYPE_CHECKING
+
+import numpy as np  # type: ignore
+
+if TYPE_CHECKING:
+    from entity import Entity
+
+
+class EntityStore:
+    """Копия состояния объектов одной карты в виде массивов по полям.
+
+    Строка массива - это entity_id объекта (id выдает GameMap.add_entity), поэтому
+    id из blocker_ids сразу указывают на строки. Сами объекты остаются главными:
+    GameMap обновляет строку при добавлении, перемещении, удалении объекта и в
+    update_entity (смерть, изменение hp). Столбцы читаются векторно: координаты и
+    is_alive - в запросах "кто рядом с точкой" (id берутся из blocker_ids), hp - при
+    уроне по площади, render_order, ch и fg - при отрисовке.
+    """
+
+    def __init__(self, capacity: int = 64):
+        self.x = np.zeros(capacity, dtype=np.int32)
+        self.y = np.zeros(capacity, dtype=np.int32)
+        self.hp = np.zeros(capacity, dtype=np.int32) # 0 у предметов и мертвых
+        self.render_order = np.zeros(capacity, dtype=np.uint8) # RenderOrder.value
+        self.is_alive = np.zeros(capacity, dtype=bool) # живой Actor
+        self.ch = np.zeros(capacity, dtype=np.int32) # код символа объекта
+        self.fg = np.zeros((capacity, 3), dtype=np.uint8) # цвет символа
+        self.entities: List[Optional[Entity]] = [None] * capacity
+
+    def _reserve(self, entity_id: int) -> None:
+        """Увеличивает массивы (вдвое), чтобы в них была строка `entity_id`."""
+        capacity = len(self.entities)
+        if entity_id < capacity:
+            return
+        new_capacity = max(capacity * 2, entity_id + 1)
+        for name in ("x", "y", "hp", "render_order", "is_alive", "ch", "fg"):
+            old = getattr(self, name)
+            new = np.zeros((new_capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:capacity] = old
+            setattr(self, name, new)
+        self.entities.extend([None] * (new_capacity - capacity))
+
+    def update(self, entity: Entity) -> None:
+        """Записывает (или перезаписывает) строку объекта по его текущему состоянию."""
+        i = entity.entity_id
+        self._reserve(i)
+        fighter = getattr(entity, "fighter", None)
+        self.x[i] = entity.x
+        self.y[i] = entity.y
+        self.hp[i] = fighter.hp if fighter else 0
+        self.render_order[i] = entity.render_order.value
+        self.is_alive[i] = bool(getattr(entity, "ai", None))
+        self.ch[i] = ord(entity.char)
+        self.fg[i] = entity.color
+        self.entities[i] = entity
+
+    def update_many(self, first_id: int, entities: List[Entity]) -> None:
+        """Записывает строки объектов с id first_id, first_id + 1, ... - по присваиванию на столбец."""
+        end = first_id + len(entities)
+        self._reserve(end - 1)
+        rows = slice(first_id, end)
+        fighters = [getattr(entity, "fighter", None) for entity in entities]
+        self.x[rows] = [entity.x for entity in entities]
+        self.y[rows] = [entity.y for entity in entities]
+        self.hp[rows] = [fighter.hp if fighter else 0 for fighter in fighters]
+        self.render_order[rows] = [entity.render_order.value for entity in entities]
+        self.is_alive[rows] = [bool(getattr(entity, "ai", None)) for entity in entities]
+        self.ch[rows] = [ord(entity.char) for entity in entities]
+        self.fg[rows] = [entity.color for entity in entities]
+        self.entities[rows] = entities
+
+    def move(self, entity_id: int, x: int, y: int) -> None:
+        self.x[entity_id] = x
+        self.y[entity_id] = y
+
+    def remove(self, entity_id: int) -> None:
+        self.is_alive[entity_id] = False
+        self.entities[entity_id] = None
@@ -0,0 +1,45 @@
+# статистика времени кадров главного цикла (для профилирования отрисовки)
+from __future__ import annotations
+
+from bisect import bisect_left
+from typing import List, Tuple
+
+
+class FrameTimeHistogram:
+    """Гистограмма времени кадров: сколько кадров попало в каждый интервал миллисекунд.
+
+    Кадр - это отрисовка консоли и context.present; время ожидания событий не входит,
+    поэтому простой не портит статистику, а тяжелые кадры видны в верхних корзинах.
+    """
+
+    BOUNDS_MS = (1, 2, 4, 8, 16, 33, 66, 100) # верхние границы корзин; последняя - "больше 100"
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(self.BOUNDS_MS) + 1)
+        self.frames = 0
+        self.total_ms = 0.0
+        self.worst_ms = 0.0
+
+    def record(self, seconds: float) -> None:
+        """Добавляет кадр длительностью `seconds`."""
+        ms = seconds * 1000
+        self.counts[bisect_left(self.BOUNDS_MS, ms)] += 1
+        self.frames += 1
+        self.total_ms += ms
+        self.worst_ms = max(self.worst_ms, ms)
+
+    def buckets(self) -> List[Tuple[str, int]]:
+        """Корзины с подписями вида "<=16 ms" и число кадров в каждой."""
+        labels = [f"<={bound} ms" for bound in self.BOUNDS_MS] + [f">{self.BOUNDS_MS[-1]} ms"]
+        return list(zip(labels, self.counts))
+
+    def summary(self) -> str:
+        """Текстовая сводка: число кадров, среднее и худшее время и непустые корзины."""
+        if not self.frames:
+            return "frames: 0"
+        lines = [
+            f"frames: {self.frames}, average {self.total_ms / self.frames:.2f} ms, "
+            f"worst {self.worst_ms:.2f} ms"
+        ]
+        lines.extend(f"{label:>9}: {count}" for label, count in self.buckets() if count)
+        return "\n".join(lines)
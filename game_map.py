@@ -1,11 +1,24 @@
 from __future__ import annotations 
 
-from typing import Iterable, Iterator, Optional, TYPE_CHECKING 
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+import os
+import pickle
+import random
+import shutil
+import tempfile
+import weakref
+import zlib
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple, TYPE_CHECKING 
 
 import numpy as np  # type: ignore
 from tcod.console import Console
 
 from entity import Actor, Item
+from entity_store import EntityStore
+import instrumentation
+from packed_mask import PackedMask
+from render_order import RenderOrder
 import tile_types
 
 if TYPE_CHECKING:
@@ -15,94 +28,393 @@ if TYPE_CHECKING:
 
 class GameMap:
     def __init__( 
-        self, engine: Engine, width: int, height: int, entities: Iterable[Entity] = ()
+        self,
+        engine: Engine,
+        width: int,
+        height: int,
+        entities: Iterable[Entity] = (),
+        explored_file: Optional[str] = None,
+        tiles: Optional[np.ndarray] = None,
     ):
         self.engine = engine
         self.width, self.height = width, height
-        self.entities = set(entities)
-        self.tiles = np.full((width, height), fill_value=tile_types.wall, order="F") #покрывает все стеной сплошной 
+        self.entities: Set[Entity] = set()
+        if tiles is None: # готовые плитки передаются, например, при загрузке сохранения
+            tiles = np.full((width, height), fill_value=tile_types.wall, order="F") #покрывает все стеной сплошной 
+        self.tiles = tiles
         
         self.visible = np.full( 
             (width, height), fill_value=False, order="F"
         )  # Плитка, которую игрок может видеть в данный момент 
-        self.explored = np.full(
-            (width, height), fill_value=False, order="F"
-        )  # Плитки, виденные ранее
+        self.explored = PackedMask(
+            width, height, filename=explored_file
+        )  # Плитки, виденные ранее (1 бит на плитку, по желанию - в файле на диске)
+
+        # Готовая картинка карты (плитки с учетом visible/explored). Собирается при первой
+        # отрисовке, дальше меняется только в update_visible там, где изменилась видимость,
+        # а render просто копирует ее.
+        self._graphics: Optional[np.ndarray] = None
 
         self.downstairs_location = (0, 0)
+        self.upstairs_location = (0, 0) # место, где игрок появляется на этаже
+
+        # Индекс занятости плиток: id блокирующего объекта на каждой плитке (0 - свободно)
+        # и словарь плитка -> объекты. Обновляется через add_entity/remove_entity/move_entity.
+        self.blocker_ids = np.zeros((width, height), dtype=np.int32, order="F")
+        self.entities_by_location: Dict[Tuple[int, int], List[Entity]] = {}
+        self._entities_by_id: Dict[int, Entity] = {} # в порядке добавления, для воспроизводимости
+        self._next_entity_id = 1
+        # Координаты, hp и т.п. всех объектов карты в массивах NumPy (строка = entity_id)
+        # для векторных запросов; обновляется вместе с индексом занятости.
+        self.entity_store = EntityStore()
+        # Объекты по слоям отрисовки (снизу вверх), внутри слоя - в порядке добавления.
+        self.render_buckets: Dict[RenderOrder, Dict[int, Entity]] = {order: {} for order in RenderOrder}
+
+        # Массив стоимости для поиска пути строится из tiles при первом обращении
+        # и дальше обновляется по одной плитке при перемещении блокирующих объектов.
+        self._cost: Optional[np.ndarray] = None
+        self._cost_view: Optional[np.ndarray] = None
+
+        for entity in entities:
+            self.add_entity(entity)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Состояние для сохранения этажа: без движка и без того, что легко пересчитать."""
+        state = self.__dict__.copy()
+        del state["engine"]
+        state["visible"] = None
+        state["_graphics"] = None
+        state["_cost"] = state["_cost_view"] = None
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        """Восстанавливает этаж; движок нужно назначить отдельно (GameWorld делает это сам)."""
+        self.__dict__.update(state)
+        self.visible = np.full((self.width, self.height), fill_value=False, order="F")
 
     @property
     def gamemap(self) -> GameMap:
         return self
 
+    @property
+    def ordered_entities(self) -> Iterator[Entity]:
+        """Итерируется по объектам карты в порядке добавления."""
+        yield from self._entities_by_id.values()
+
     @property
     def actors(self) -> Iterator[Actor]:
         """Итерируется по actors карты."""
         yield from (
             entity
-            for entity in self.entities
+            for entity in self._entities_by_id.values()
             if isinstance(entity, Actor) and entity.is_alive
         )
 
     @property
     def items(self) -> Iterator[Item]:
-        yield from (entity for entity in self.entities if isinstance(entity, Item))
+        yield from (entity for entity in self._entities_by_id.values() if isinstance(entity, Item))
+
+    @property
+    def cost(self) -> np.ndarray:
+        """Стоимость прохода по плиткам для поиска пути (только для чтения).
+
+        0 - стена, 1 - свободный пол, 11 - пол с блокирующим объектом.
+        Более низкое значение штрафа заставляет врагов толпиться друг за другом в коридорах,
+        более высокое - обходить длинным путем, чтобы окружить игрока.
+        """
+        if self._cost_view is None:
+            self._cost = np.array(self.tiles["walkable"], dtype=np.int8, order="F")
+            self._cost[(self.blocker_ids != 0) & (self._cost != 0)] += 10
+            self._cost_view = self._cost.view()
+            self._cost_view.flags.writeable = False
+        return self._cost_view
+
+    def add_entity(self, entity: Entity) -> None:
+        """Добавляет объект на карту и в индекс занятости по его текущим координатам."""
+        if entity in self.entities:
+            return
+        entity.entity_id = self._next_entity_id
+        self._next_entity_id += 1
+        self._entities_by_id[entity.entity_id] = entity
+        self.entities.add(entity)
+        self.entities_by_location.setdefault((entity.x, entity.y), []).append(entity)
+        self.entity_store.update(entity)
+        self.render_buckets[entity.render_order][entity.entity_id] = entity
+        self._refresh_location(entity.x, entity.y)
+
+    def add_entities(self, entities: List[Entity]) -> None:
+        """Добавляет на карту сразу много объектов (например, при загрузке партии).
+
+        Результат тот же, что у add_entity для каждого объекта по порядку, но entity_store
+        и blocker_ids заполняются несколькими операциями NumPy, а не по плитке на объект.
+        """
+        entities = [entity for entity in entities if entity not in self.entities]
+        if not entities:
+            return
+        first_id = self._next_entity_id
+        self._next_entity_id += len(entities)
+        for entity_id, entity in enumerate(entities, first_id):
+            entity.entity_id = entity_id
+            self._entities_by_id[entity_id] = entity
+            self.entities_by_location.setdefault((entity.x, entity.y), []).append(entity)
+            self.render_buckets[entity.render_order][entity_id] = entity
+        self.entities.update(entities)
+        self.entity_store.update_many(first_id, entities)
+
+        blockers = [
+            entity
+            for entity in entities
+            if entity.blocks_movement and self.in_bounds(entity.x, entity.y)
+        ]
+        if not blockers:
+            return
+        xs = np.array([entity.x for entity in blockers])
+        ys = np.array([entity.y for entity in blockers])
+        ids = np.array([entity.entity_id for entity in blockers], dtype=np.int32)
+        # Как в _refresh_location, на плитке остается первый блокирующий объект.
+        _, first = np.unique(xs * self.height + ys, return_index=True)
+        xs, ys, ids = xs[first], ys[first], ids[first]
+        free = self.blocker_ids[xs, ys] == 0
+        self.blocker_ids[xs[free], ys[free]] = ids[free]
+        self._cost = self._cost_view = None  # Стоимость пересчитается при следующем обращении.
+
+    def remove_entity(self, entity: Entity) -> None:
+        """Убирает объект с карты и из индекса занятости."""
+        if entity not in self.entities:
+            return
+        self.entities.remove(entity)
+        if self._entities_by_id.get(entity.entity_id) is entity:
+            del self._entities_by_id[entity.entity_id]
+            render_order = RenderOrder(int(self.entity_store.render_order[entity.entity_id]))
+            del self.render_buckets[render_order][entity.entity_id]
+            self.entity_store.remove(entity.entity_id)
+        self._unlink_location(entity)
+        self._refresh_location(entity.x, entity.y)
+
+    def move_entity(self, entity: Entity, x: int, y: int) -> None:
+        """Переносит объект карты на плитку (x, y), обновляя индекс занятости."""
+        old_x, old_y = entity.x, entity.y
+        self._unlink_location(entity)
+        entity.x, entity.y = x, y
+        self.entities_by_location.setdefault((x, y), []).append(entity)
+        self.entity_store.move(entity.entity_id, x, y)
+        self._refresh_location(old_x, old_y)
+        self._refresh_location(x, y)
+
+    def update_entity(self, entity: Entity) -> None:
+        """Обновляет индексы после изменения свойств объекта (hp, blocks_movement при смерти и т.п.)."""
+        if entity in self.entities:
+            # В entity_store еще лежит прежний render_order: по нему находим старый слой.
+            old_order = self.entity_store.render_order[entity.entity_id]
+            if old_order != entity.render_order.value:
+                del self.render_buckets[RenderOrder(int(old_order))][entity.entity_id]
+                self.render_buckets[entity.render_order][entity.entity_id] = entity
+            self.entity_store.update(entity)
+            self._refresh_location(entity.x, entity.y)
+
+    def _unlink_location(self, entity: Entity) -> None:
+        location = (entity.x, entity.y)
+        entities_here = self.entities_by_location[location]
+        entities_here.remove(entity)
+        if not entities_here:
+            del self.entities_by_location[location]
+
+    def _refresh_location(self, x: int, y: int) -> None:
+        """Пересчитывает id блокирующего объекта для плитки (x, y)."""
+        if not self.in_bounds(x, y):
+            return
+        blocker_id = 0
+        for entity in self.entities_by_location.get((x, y), ()):
+            if entity.blocks_movement:
+                blocker_id = entity.entity_id
+                break
+        self.blocker_ids[x, y] = blocker_id
+        if self._cost is not None and self.tiles["walkable"][x, y]:
+            self._cost[x, y] = 11 if blocker_id else 1
+
+    def get_entities_at_location(self, x: int, y: int) -> List[Entity]:
+        """Возвращает все объекты, стоящие на плитке (x, y)."""
+        return self.entities_by_location.get((x, y), [])
+
+    def is_free_for_spawn(self, x: int, y: int) -> bool:
+        """True, если на плитке нет объектов и это не место появления игрока."""
+        return (x, y) != self.upstairs_location and not self.get_entities_at_location(x, y)
 
     def get_blocking_entity_at_location( #эта функция нужна, чтобы найти монстра, на которого наткнулся игрок
         self, location_x: int, location_y: int,
     ) -> Optional[Entity]:
-        for entity in self.entities:
-            if ( 
-                entity.blocks_movement
-                and entity.x == location_x
-                and entity.y == location_y
-            ): 
-                return entity
+        if not self.in_bounds(location_x, location_y):
+            return None
+        blocker_id = self.blocker_ids[location_x, location_y]
+        if blocker_id:
+            return self._entities_by_id[blocker_id]
 
         return None
     
 
     def get_actor_at_location(self, x: int, y: int) -> Optional[Actor]:
-        for actor in self.actors:
-            if actor.x == x and actor.y == y:
-                return actor
+        for entity in self.get_entities_at_location(x, y):
+            if isinstance(entity, Actor) and entity.is_alive:
+                return entity
 
         return None
 
+    def _actor_ids_in_radius(self, x: int, y: int, radius: int) -> Tuple[np.ndarray, np.ndarray]:
+        """id живых actors не дальше `radius` от (x, y) по возрастанию и квадраты их расстояний.
+
+        Живые actors всегда блокируют движение, поэтому их id берутся из blocker_ids
+        в квадрате вокруг точки, а расстояние проверяется по entity_store - работа
+        зависит от размера квадрата и числа попавших в него, а не от всех actors карты.
+        """
+        x1, y1 = max(0, x - radius), max(0, y - radius)
+        x2, y2 = min(self.width, x + radius + 1), min(self.height, y + radius + 1)
+        box = self.blocker_ids[x1:x2, y1:y2]
+        ids = np.sort(box[box != 0])
+        store = self.entity_store
+        dx = store.x[ids] - x
+        dy = store.y[ids] - y
+        distance2 = dx * dx + dy * dy
+        found = store.is_alive[ids] & (distance2 <= radius * radius)
+        return ids[found], distance2[found]
+
+    def get_actors_in_radius(self, x: int, y: int, radius: int) -> List[Actor]:
+        """Живые actors не дальше `radius` от (x, y), в том же порядке, что и actors."""
+        ids, _ = self._actor_ids_in_radius(x, y, radius)
+        return [self.entity_store.entities[i] for i in ids.tolist()]
+
+    def get_nearest_actor(
+        self,
+        x: int,
+        y: int,
+        max_range: int,
+        visible_only: bool = True,
+        exclude: Optional[Actor] = None,
+        strict: bool = False,
+    ) -> Optional[Actor]:
+        """Ближайший к (x, y) живой actor не дальше `max_range` или None.
+
+        `visible_only` оставляет только actors на видимых плитках, `exclude` пропускает
+        одного actor (обычно самого стреляющего), `strict` требует расстояние строго
+        меньше `max_range`. Из равноудаленных выбирается тот, что раньше идет в actors.
+        """
+        ids, distance2 = self._actor_ids_in_radius(x, y, max_range)
+        store = self.entity_store
+        candidates = np.ones(len(ids), dtype=bool)
+        if strict:
+            candidates &= distance2 < max_range * max_range
+        if visible_only:
+            candidates &= self.visible[store.x[ids], store.y[ids]]
+        if exclude is not None:
+            candidates &= ids != exclude.entity_id
+        if not candidates.any():
+            return None
+        ids, distance2 = ids[candidates], distance2[candidates]
+        return store.entities[int(ids[np.argmin(distance2)])]
+
     def in_bounds(self, x: int, y: int) -> bool:
         """возвращает True, если координаты внутри границ карты."""
 #(нужно, чтобы игрок не мог выйти за пределы карты)
         return 0 <= x < self.width and 0 <= y < self.height
 
-    def render(self, console: Console) -> None:
+    def update_visible(self, x: int, y: int, visible: np.ndarray) -> None:
+        """Записывает новую видимость для прямоугольника с левым верхним углом (x, y).
+
+        Плитки, ставшие видимыми, добавляются к исследованным, а картинка карты
+        обновляется только в клетках, где видимость изменилась: новые видимые плитки
+        рисуются светлыми, переставшие быть видимыми (они уже исследованы) - темными.
+        """
+        width, height = visible.shape
+        region = slice(x, x + width), slice(y, y + height)
+        changed = visible != self.visible[region]
+        if not changed.any():
+            return
+
+        self.visible[region] = visible
+        self.explored.union(x, y, visible)
+
+        if self._graphics is None:
+            return  # Картинка еще не собиралась, render соберет ее целиком.
+        tiles = self.tiles[region][changed]
+        graphics = self._graphics[region]
+        graphics[changed] = np.where(visible[changed], tiles["light"], tiles["dark"])
+
+    def refresh_graphics(self) -> None:
+        """Полностью пересобирает картинку карты из tiles, visible и explored."""
+        self._graphics = np.select(
+            condlist=[self.visible, self.explored.to_array()],
+            choicelist=[self.tiles["light"], self.tiles["dark"]],
+            default=tile_types.SHROUD,
+        )
+        self._graphics = np.asfortranarray(self._graphics)
+
+    @instrumentation.timed("game_map.render")
+    def render(
+        self, console: Console, viewport: Optional[Tuple[int, int, int, int]] = None
+    ) -> None:
         """
         Визуализирует карту. 
  
         Если плитка в зоне видимости, то она отрисовывается в светлых цветах.  
         Если нет, но она была ранее исследована, тогда отрисовывается темными цветами.
         Во всех других случаях используется SHROUD (по дефолту) (черные плитки).
+
+        `viewport` - часть карты (x, y, ширина, высота), которая рисуется в левый верхний
+        угол консоли; по умолчанию рисуется вся карта.
         """
-        console.tiles_rgb[0 : self.width, 0 : self.height] = np.select( 
-# np.select позволяет отрисовывать плитки, которые мы хотим, опираясь на то, что указано в condlist
-            condlist=[self.visible, self.explored],
-            choicelist=[self.tiles["light"], self.tiles["dark"]],
-            default=tile_types.SHROUD,
-        ) 
+        if self._graphics is None:
+            self.refresh_graphics()
+        view_x, view_y, width, height = viewport or (0, 0, self.width, self.height)
+        console.tiles_rgb[0:width, 0:height] = self._graphics[
+            view_x : view_x + width, view_y : view_y + height
+        ]
+
+        # Объекты в FOV рисуются одной записью символов и цветов из entity_store в консоль.
+        store = self.entity_store
+        visible_ids = []
+        for bucket in self.render_buckets.values():
+            if bucket:
+                ids = np.fromiter(bucket, dtype=np.intp, count=len(bucket))
+                xs, ys = store.x[ids] - view_x, store.y[ids] - view_y
+                ids = ids[(xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)]
+                visible_ids.append(ids[self.visible[store.x[ids], store.y[ids]]])
+        ids = np.concatenate(visible_ids)[::-1] if visible_ids else ()
+        if not len(ids):
+            return
+        # Из объектов на одной плитке остается последний в порядке отрисовки (верхний).
+        xs, ys = store.x[ids] - view_x, store.y[ids] - view_y
+        _, top = np.unique(xs * height + ys, return_index=True)
+        ids, xs, ys = ids[top], xs[top], ys[top]
+        tiles = console.tiles_rgb
+        tiles["ch"][xs, ys] = store.ch[ids]
+        tiles["fg"][xs, ys] = store.fg[ids]
+
+# Один фоновый поток на все игры: генерирует следующий этаж, пока игрок исследует текущий.
+_pregeneration_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pregenerate-floor")
+
+# Один фоновый поток на все игры: кодирует покинутые этажи для сохранения партии
+# и сжимает на диск те из них, что вытеснены из кэша.
+_left_floor_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="left-floor")
 
-        entities_sorted_for_rendering = sorted( 
-            self.entities, key=lambda x: x.render_order.value
-        ) 
 
-        for entity in entities_sorted_for_rendering: 
-           # печатает только те объекты, которые находятся в FOV
-            if self.visible[entity.x, entity.y]:
-                console.print( 
-                    x=entity.x, y=entity.y, string=entity.char, fg=entity.color
-                ) 
+def _finished(result: Any) -> Future:
+    """Future, у которого результат уже есть."""
+    future: Future = Future()
+    future.set_result(result)
+    return future
+
 
 class GameWorld:
     """
     Содержит настройки для GameMap, и генерирует новые карты при передвижении по лестнице.
+
+    Если `pregenerate` - True, следующий этаж генерируется заранее в фоновом потоке,
+    и переход по лестнице не ждет procgen.
+    Если задан `explored_dir`, маски исследованных плиток этажей хранятся в файлах
+    этой папки (np.memmap), а не в памяти.
+
+    Покинутые этажи не выбрасываются: последние `max_cached_floors` из них лежат
+    в памяти, а более старые сжимаются во временные файлы на диске, так что на
+    этаж можно вернуться по лестнице наверх.
     """
 
     def __init__(
@@ -115,10 +427,19 @@ class GameWorld:
         room_min_size: int,
         room_max_size: int,
         current_floor: int = 0,
-        lvl: int
+        lvl: int,
+        seed: Optional[int] = None,
+        pregenerate: bool = True,
+        explored_dir: Optional[str] = None,
+        max_cached_floors: int = 2,
     ):
         self.engine = engine
 
+        # seed всего мира: по нему воспроизводятся все этажи.
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        self.seed = seed
+
         self.map_width = map_width
         self.map_height = map_height
 
@@ -130,19 +451,218 @@ class GameWorld:
         self.current_floor = current_floor
         self.lvl = lvl
 
+        self.pregenerate = pregenerate
+        self.explored_dir = explored_dir
+        self._pending_floor: Optional[Tuple[int, Future]] = None # (номер этажа, фоновая генерация)
+
+        self.max_cached_floors = max_cached_floors
+        self._cached_floors: OrderedDict[int, GameMap] = OrderedDict() # от давно покинутых к недавним
+        self._evicted_floors: Dict[int, Future] = {} # номер этажа -> фоновая запись в сжатый файл
+        self._evicted_dir: Optional[str] = None
+        # Покинутые этажи загруженной партии: их массивы из файла сохранения (savegame.decode_floor).
+        self._saved_floors: Dict[int, Dict[str, np.ndarray]] = {}
+        # Покинутые этажи не меняются, поэтому их массивы для сохранения партии
+        # кодируются один раз, в фоне, при попадании этажа в кэш (от давно покинутых к недавним).
+        self._floor_snapshots: Dict[int, Future] = {}
+        # tiles не меняются и после генерации, поэтому палитра и индексы (savegame.encode_tiles)
+        # считаются один раз на этаж, в том числе для текущего.
+        self._tiles_encodings: Dict[int, Future] = {}
+
     def generate_floor(self) -> None:
-        from procgen import generate_spaceship
+        """Переводит игрока на следующий этаж (генерирует его, если там еще не были)."""
+        self.change_floor(self.current_floor + 1)
+
+    def ascend(self) -> None:
+        """Возвращает игрока на предыдущий этаж, к его лестнице вниз."""
+        self.change_floor(self.current_floor - 1)
+
+    def change_floor(self, floor: int) -> None:
+        """Делает этаж `floor` текущим.
+
+        При спуске игрок появляется у лестницы наверх, при подъеме - у лестницы вниз.
+        Покинутый этаж попадает в кэш.
+        """
+        descending = floor > self.current_floor
+        left_floor = self.current_floor
+        left_map = self.engine.game_map if left_floor else None
+        self.current_floor = floor
+
+        game_map = self._take_cached(floor)
+        if game_map is None:
+            game_map = self._take_pregenerated(floor)
+        if game_map is None:
+            game_map = self._generate(floor)
+
+        self.engine.game_map = game_map
+        if descending:
+            self.engine.player.place(*game_map.upstairs_location, game_map)
+        else:
+            self.engine.player.place(*game_map.downstairs_location, game_map)
+
+        # В кэш этаж попадает уже без игрока (и его инвентаря).
+        if left_map is not None:
+            self._cache_floor(left_floor, left_map)
+        self._start_pregeneration(floor + 1)
+
+    def _cache_floor(self, floor: int, game_map: GameMap) -> None:
+        """Кладет покинутый этаж в кэш; самые давние этажи сверх лимита уходят на диск.
+
+        Массивы этажа для сохранения (savegame.snapshot_map) кодируются в фоновом потоке.
+        """
+        import savegame
+
+        self._floor_snapshots[floor] = _left_floor_executor.submit(
+            savegame.snapshot_map, game_map, floor
+        )
+        self._encode_tiles(floor, game_map)
+        self._cached_floors[floor] = game_map
+        self._cached_floors.move_to_end(floor)
+        while len(self._cached_floors) > self.max_cached_floors:
+            old_floor, old_map = self._cached_floors.popitem(last=False)
+            # Покинутый этаж больше не меняется, поэтому его можно сжимать в фоне,
+            # не задерживая переход по лестнице.
+            self._evicted_floors[old_floor] = _left_floor_executor.submit(
+                self._evict, old_floor, old_map
+            )
+
+    def _evict(self, floor: int, game_map: GameMap) -> str:
+        """Сжимает этаж (tiles, explored, объекты) в файл во временной папке; возвращает его имя."""
+        if self._evicted_dir is None:
+            self._evicted_dir = tempfile.mkdtemp(prefix="spaceship-floors-")
+            # Папка удаляется вместе с миром или при выходе из игры.
+            weakref.finalize(self, shutil.rmtree, self._evicted_dir, True)
+        if isinstance(game_map.explored.bits, np.memmap):
+            game_map.explored.flush()
+        path = os.path.join(self._evicted_dir, f"floor_{floor}.bin")
+        with open(path, "wb") as f:
+            f.write(zlib.compress(pickle.dumps(game_map, protocol=pickle.HIGHEST_PROTOCOL)))
+        return path
+
+    def _load_evicted(self, path: str) -> GameMap:
+        with open(path, "rb") as f:
+            game_map: GameMap = pickle.loads(zlib.decompress(f.read()))
+        game_map.engine = self.engine
+        return game_map
 
-        self.current_floor += 1
+    def _take_cached(self, floor: int) -> Optional[GameMap]:
+        """Достает покинутый этаж (из памяти, с диска или из сохранения); None, если там еще не были."""
+        snapshot = self._floor_snapshots.pop(floor, None)
+        if snapshot is not None:
+            # Этаж снова станет текущим и будет меняться: фоновое кодирование должно закончиться.
+            wait([snapshot])
+        if floor in self._cached_floors:
+            return self._cached_floors.pop(floor)
+        if floor in self._saved_floors:
+            import savegame
 
-        self.engine.game_map = generate_spaceship(
+            arrays = self._saved_floors.pop(floor)
+            return savegame.decode_floor(
+                self.engine, floor, arrays, self._tiles_encodings[floor].result()
+            )
+        if floor in self._evicted_floors:
+            path = self._evicted_floors.pop(floor).result()  # Ждет, если этаж еще сжимается.
+            game_map = self._load_evicted(path)
+            os.remove(path)
+            return game_map
+        return None
+
+    def is_floor_visited(self, floor: int) -> bool:
+        return (
+            floor in self._cached_floors
+            or floor in self._evicted_floors
+            or floor in self._saved_floors
+        )
+
+    def floor_snapshots(self) -> Dict[int, Future]:
+        """Массивы покинутых этажей для сохранения, от давно покинутых к недавним.
+
+        Это Future с результатом savegame.snapshot_map: этажи кодируются в фоновом потоке.
+        """
+        return dict(self._floor_snapshots)
+
+    def tiles_encoding(self, floor: int) -> Future:
+        """Future с палитрой и индексами tiles этажа `floor` (текущего или покинутого)."""
+        if floor == self.current_floor:
+            self._encode_tiles(floor, self.engine.game_map)
+        return self._tiles_encodings[floor]
+
+    def _encode_tiles(self, floor: int, game_map: GameMap) -> None:
+        """Запускает фоновое кодирование tiles этажа, если оно еще не сделано."""
+        if floor not in self._tiles_encodings:
+            import savegame
+
+            self._tiles_encodings[floor] = _left_floor_executor.submit(
+                savegame.encode_tiles, game_map.tiles
+            )
+
+    def restore_floors(
+        self,
+        floors: Iterable[Tuple[int, Dict[str, np.ndarray]]],
+        tiles: Dict[int, Tuple[np.ndarray, np.ndarray]],
+    ) -> None:
+        """Запоминает покинутые этажи загруженной партии и готовит следующий этаж.
+
+        Массивы этажей и палитры с индексами tiles (для всех этажей, включая текущий)
+        берутся из файла сохранения, так что заново они не кодируются. Покинутый этаж
+        собирается из них, только когда игрок на него вернется.
+        """
+        for floor, encoding in tiles.items():
+            self._tiles_encodings[floor] = _finished(encoding)
+        for floor, arrays in floors:
+            self._saved_floors[floor] = arrays
+            self._floor_snapshots[floor] = _finished(arrays)
+        self._start_pregeneration(self.current_floor + 1)
+
+    def explored_file(self, floor: int) -> Optional[str]:
+        """Файл маски исследованных плиток этажа или None, если маски хранятся в памяти."""
+        if not self.explored_dir:
+            return None
+        return os.path.join(self.explored_dir, f"floor_{floor}.explored")
+
+    def _generate(self, floor: int) -> GameMap:
+        from procgen import generate_spaceship
+
+        return generate_spaceship(
             max_rooms=self.max_rooms,
             room_min_size=self.room_min_size,
             room_max_size=self.room_max_size,
             map_width=self.map_width,
             map_height=self.map_height,
             engine=self.engine,
-            floor=self.current_floor,
+            floor=floor,
             lvl=self.lvl,
+            rng=self.floor_rng(floor),
+            explored_file=self.explored_file(floor),
         )
 
+    def _start_pregeneration(self, floor: int) -> None:
+        """Запускает фоновую генерацию этажа `floor`, если он существует и еще не создан."""
+        if not self.pregenerate or floor > self.lvl or self.is_floor_visited(floor):
+            return
+        if self._pending_floor is not None and self._pending_floor[0] == floor:
+            return
+        self._pending_floor = (floor, _pregeneration_executor.submit(self._generate, floor))
+
+    def _take_pregenerated(self, floor: int) -> Optional[GameMap]:
+        """Возвращает заранее сгенерированный этаж `floor` или None.
+
+        Если фоновая генерация еще не началась, она отменяется и этаж генерируется
+        синхронно. Если уже идет - ждать ее быстрее, чем начинать заново
+        (результат тот же, т.к. этаж зависит только от seed).
+        """
+        if self._pending_floor is None or self._pending_floor[0] != floor:
+            return None
+        future = self._pending_floor[1]
+        self._pending_floor = None
+        if future.cancel():
+            return None
+        return future.result()
+
+    def floor_rng(self, floor: int) -> random.Random:
+        """Возвращает ГСЧ для генерации этажа `floor`.
+
+        Он зависит только от seed мира и номера этажа, поэтому этаж получается
+        одинаковым независимо от того, что и в каком порядке происходило до этого.
+        """
+        return random.Random(f"{self.seed}:{floor}")
+
@@ -1,6 +1,8 @@
 # ввод с клавиатуры (обработка инпута)
 from __future__ import annotations
+import os
 from typing import Callable, Optional, Tuple, TYPE_CHECKING, Union
+import tcod
 import tcod.event
 
 import actions
@@ -12,6 +14,7 @@ from actions import (
 )
 import color
 import exceptions
+import instrumentation
 
 
 if TYPE_CHECKING:
@@ -83,6 +86,31 @@ class BaseEventHandler(tcod.event.EventDispatch[ActionOrHandler]):
     def ev_quit(self, event: tcod.event.Quit) -> Optional[Action]:
         raise SystemExit()
 
+class PopupMessage(BaseEventHandler):
+    """Показывает текст поверх затемненного экрана предыдущего обработчика."""
+
+    def __init__(self, parent_handler: BaseEventHandler, text: str):
+        self.parent = parent_handler
+        self.text = text
+
+    def on_render(self, console: tcod.Console) -> None:
+        self.parent.on_render(console)
+        console.tiles_rgb["fg"] //= 8
+        console.tiles_rgb["bg"] //= 8
+
+        console.print(
+            console.width // 2,
+            console.height // 2,
+            self.text,
+            fg=color.white,
+            bg=color.black,
+            alignment=tcod.CENTER,
+        )
+
+    def ev_keydown(self, event: tcod.event.KeyDown) -> Optional[BaseEventHandler]:
+        """Любая клавиша возвращает к предыдущему обработчику."""
+        return self.parent
+
 class EventHandler(BaseEventHandler):
     def __init__(self, engine: Engine):
         self.engine = engine
@@ -109,20 +137,25 @@ class EventHandler(BaseEventHandler):
             return False
 
         try:
-            action.perform()
+            with instrumentation.timer("action.perform"):
+                action.perform()
         except exceptions.Impossible as exc:
             self.engine.message_log.add_message(exc.args[0], color.impossible)
             return False  # Пропускает ход врага в exceptions.
 
+        instrumentation.count("turns")
         self.engine.handle_enemy_turns()
 
         self.engine.update_fov()
+        if self.engine.autosaver:
+            self.engine.autosaver.end_turn()
         return True
 
 
     def ev_mousemotion(self, event: tcod.event.MouseMotion) -> None: # запись информации о местонахождении мыши
-        if self.engine.game_map.in_bounds(event.tile.x, event.tile.y):
-            self.engine.mouse_location = event.tile.x, event.tile.y
+        location = self.engine.screen_to_map(event.tile.x, event.tile.y)
+        if location:
+            self.engine.mouse_location = location
 
     def on_render(self, console: tcod.Console) -> None:
         self.engine.render(console)
@@ -169,7 +202,7 @@ class ControlsEventHandler(AskUserEventHandler):
             x=x,
             y=0,
             width=35,
-            height=8,
+            height=9,
             title=self.TITLE,
             clear=True,
             fg=(255, 255, 255),
@@ -180,6 +213,7 @@ class ControlsEventHandler(AskUserEventHandler):
         console.print(x=x + 1, y=3, string="i - to open inventory log")
         console.print(x=x + 1, y=4, string="space - to use the stairs")
         console.print(x=x + 1, y=5, string="enter - to use the weapon")
+        console.print(x=x + 1, y=6, string="F3 - to show the profiler")
 
 
 class InventoryEventHandler(AskUserEventHandler):
@@ -268,7 +302,7 @@ class SelectIndexHandler(AskUserEventHandler):
    def on_render(self, console: tcod.Console) -> None:
        """Выделяет (подсвечивает) плитку под курсором."""
        super().on_render(console)
-       x, y = self.engine.mouse_location
+       x, y = self.engine.map_to_screen(*self.engine.mouse_location)
        console.tiles_rgb["bg"][x, y] = color.white
        console.tiles_rgb["fg"][x, y] = color.black
 
@@ -288,9 +322,10 @@ class SelectIndexHandler(AskUserEventHandler):
            dx, dy = MOVE_KEYS[key]
            x += dx * modifier
            y += dy * modifier
-           # Фиксирует указатель курсора в соответствии с размером карты.
-           x = max(0, min(x, self.engine.game_map.width - 1))
-           y = max(0, min(y, self.engine.game_map.height - 1))
+           # Фиксирует указатель курсора в пределах видимой части карты.
+           view_x, view_y, width, height = self.engine.viewport
+           x = max(view_x, min(x, view_x + width - 1))
+           y = max(view_y, min(y, view_y + height - 1))
            self.engine.mouse_location = x, y
            return None
        elif key in CONFIRM_KEYS:
@@ -299,9 +334,10 @@ class SelectIndexHandler(AskUserEventHandler):
 
    def ev_mousebuttondown(self, event: tcod.event.MouseButtonDown) -> Optional[ActionOrHandler]:
        """Клик левой кнопкой мыши возвращает местонахождение курсора."""
-       if self.engine.game_map.in_bounds(*event.tile):
+       location = self.engine.screen_to_map(*event.tile)
+       if location:
            if event.button == 1:
-               return self.on_index_selected(*event.tile)
+               return self.on_index_selected(*location)
        return super().ev_mousebuttondown(event)
 
    def on_index_selected(self, x: int, y: int) -> Optional[ActionOrHandler]:
@@ -347,7 +383,7 @@ class AreaRangedAttackHandler(SelectIndexHandler):
        """Выделяет плитку под курсором."""
        super().on_render(console)
 
-       x, y = self.engine.mouse_location
+       x, y = self.engine.map_to_screen(*self.engine.mouse_location)
 
        # Рисует прямоугольник вокруг области, к которую целится игрок, так что он может видеть потенциальную зону поражения.
        console.draw_frame(
@@ -394,14 +430,30 @@ class MainGameEventHandler(EventHandler):
             return LookHandler(self.engine)
         elif key == tcod.event.K_TAB:
             return ControlsEventHandler(self.engine)
+        elif key == tcod.event.K_F3:
+            # Оверлей профилирования; при первом показе включает сбор замеров.
+            self.engine.show_profiler = not self.engine.show_profiler
+            if self.engine.show_profiler:
+                instrumentation.enable()
 
         # Был нажат невалидный ключ.
         return action
 
 class GameOverEventHandler(EventHandler): 
+   def on_quit(self) -> None:
+       """Игрок погиб: сохранение удаляется, и игра закрывается без сохранения."""
+       if self.engine.autosaver:
+           self.engine.autosaver.wait()  # Иначе фоновая запись вернет удаленный файл.
+       if os.path.exists("savegame.sav"):
+           os.remove("savegame.sav")
+       raise exceptions.QuitWithoutSaving()
+
+   def ev_quit(self, event: tcod.event.Quit) -> None:
+       self.on_quit()
+
    def ev_keydown(self, event: tcod.event.KeyDown) -> None:
         if event.sym == tcod.event.K_ESCAPE:
-            raise SystemExit()
+            self.on_quit()
 
 CURSOR_Y_KEYS = {
    tcod.event.K_UP: -1,
@@ -0,0 +1,157 @@
+"""Легкая инструментация горячих участков хода: именованные таймеры и счетчики.
+
+Пока сбор выключен (по умолчанию), `timer` возвращает общий пустой контекстный
+менеджер, а обертка `timed` сразу вызывает функцию, так что в игре без
+профилирования остается только проверка одного флага. Собранное показывается
+в игре (render_functions.render_profiler) и сохраняется в JSON или CSV (dump).
+"""
+from __future__ import annotations
+
+import csv
+import functools
+import json
+import time
+from typing import Any, Callable, Dict, List, TypeVar
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+enabled = False
+
+
+class TimerStats:
+    """Накопленные замеры одного таймера (в секундах)."""
+
+    __slots__ = ("count", "total", "last", "max")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        self.max = max(self.max, seconds)
+
+
+timers: Dict[str, TimerStats] = {}
+counters: Dict[str, int] = {}
+
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        elapsed = time.perf_counter() - self.start
+        stats = timers.get(self.name)
+        if stats is None:
+            stats = timers[self.name] = TimerStats()
+        stats.add(elapsed)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc_info: Any) -> None:
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def enable(on: bool = True) -> None:
+    """Включает (или выключает) сбор замеров; накопленное не сбрасывается."""
+    global enabled
+    enabled = on
+
+
+def reset() -> None:
+    """Забывает все замеры и счетчики."""
+    timers.clear()
+    counters.clear()
+
+
+def timer(name: str) -> Any:
+    """with timer("name"): ... - замеряет время блока, если сбор включен."""
+    return _Timer(name) if enabled else _NULL_TIMER
+
+
+def timed(name: str) -> Callable[[F], F]:
+    """Декоратор: замеряет каждый вызов функции под именем `name`."""
+
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not enabled:
+                return func(*args, **kwargs)
+            with _Timer(name):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore
+
+    return decorator
+
+
+def count(name: str, amount: int = 1) -> None:
+    """Увеличивает счетчик `name`, если сбор включен."""
+    if enabled:
+        counters[name] = counters.get(name, 0) + amount
+
+
+def rows() -> List[Dict[str, Any]]:
+    """Все таймеры и счетчики в виде строк таблицы (времена в миллисекундах)."""
+    result: List[Dict[str, Any]] = []
+    for name, stats in sorted(timers.items()):
+        result.append(
+            {
+                "name": name,
+                "count": stats.count,
+                "total_ms": round(stats.total * 1000, 3),
+                "avg_ms": round(stats.total * 1000 / stats.count, 3),
+                "last_ms": round(stats.last * 1000, 3),
+                "max_ms": round(stats.max * 1000, 3),
+            }
+        )
+    for name, value in sorted(counters.items()):
+        result.append({"name": name, "count": value})
+    return result
+
+
+def overlay_lines() -> List[str]:
+    """Строки для экранного оверлея: таймеры (последний/средний/худший вызов) и счетчики."""
+    lines = []
+    for row in rows():
+        if "avg_ms" in row:
+            lines.append(
+                f"{row['name']:<26}{row['count']:>7} "
+                f"{row['last_ms']:>7.2f}{row['avg_ms']:>7.2f}{row['max_ms']:>8.2f}"
+            )
+        else:
+            lines.append(f"{row['name']:<26}{row['count']:>7}")
+    return lines
+
+
+def dump(filename: str) -> None:
+    """Сохраняет rows() в `filename`: CSV, если имя кончается на .csv, иначе JSON."""
+    data = rows()
+    if filename.lower().endswith(".csv"):
+        fields = ["name", "count", "total_ms", "avg_ms", "last_ms", "max_ms"]
+        with open(filename, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(data)
+    else:
+        with open(filename, "w") as f:
+            json.dump(data, f, indent=2)
@@ -0,0 +1,89 @@
+# битовая маска плиток карты: 1 бит на плитку вместо 1 байта у bool-массива
+from __future__ import annotations
+
+from typing import Any, Dict, Optional, Tuple, Union
+
+import numpy as np  # type: ignore
+
+
+class PackedMask:
+    """Булева маска размера (width, height), упакованная по 8 плиток в байт вдоль оси x.
+
+    Бит плитки (x, y) - это бит (x % 8) байта bits[x // 8, y]. Маска в 8 раз меньше
+    bool-массива, поэтому исследованные области всех посещенных этажей можно держать
+    в памяти. Если указан `filename`, байты лежат в np.memmap на диске.
+    """
+
+    def __init__(
+        self, width: int, height: int, filename: Optional[str] = None, mode: str = "w+"
+    ):
+        """Создает пустую маску; с `filename` - в новом файле (mode="r+" открывает существующий)."""
+        self.width, self.height = width, height
+        self.filename = filename
+        shape = ((width + 7) // 8, height)
+        if filename:
+            self.bits = np.memmap(filename, dtype=np.uint8, mode=mode, shape=shape, order="F")
+        else:
+            self.bits = np.zeros(shape, dtype=np.uint8, order="F")
+
+    def __getitem__(
+        self, key: Tuple[Union[int, slice], Union[int, slice]]
+    ) -> Union[bool, np.ndarray]:
+        """mask[x, y] - значение одной плитки, mask[x1:x2, y1:y2] - bool-массив окна."""
+        x, y = key
+        if isinstance(x, slice) and isinstance(y, slice):
+            x1, x2, _ = x.indices(self.width)
+            y1, y2, _ = y.indices(self.height)
+            return self.window(x1, y1, x2, y2)
+        return bool(self.bits[x >> 3, y] >> (x & 7) & 1)
+
+    def window(self, x1: int, y1: int, x2: int, y2: int) -> np.ndarray:
+        """Возвращает bool-массив для прямоугольника [x1, x2) x [y1, y2)."""
+        byte_x1 = x1 >> 3
+        unpacked = np.unpackbits(
+            self.bits[byte_x1 : (x2 + 7) >> 3, y1:y2], axis=0, bitorder="little"
+        )
+        return unpacked[x1 - byte_x1 * 8 : x2 - byte_x1 * 8].view(bool)
+
+    def union(self, x: int, y: int, mask: np.ndarray) -> None:
+        """Добавляет (логическое ИЛИ) bool-массив `mask` с левым верхним углом в (x, y).
+
+        Распаковываются и перепаковываются только байты, которые покрывает `mask`.
+        """
+        width, height = mask.shape
+        byte_x1, byte_x2 = x >> 3, (x + width + 7) >> 3
+        block = self.bits[byte_x1:byte_x2, y : y + height]
+        unpacked = np.unpackbits(block, axis=0, bitorder="little")
+        offset = x - byte_x1 * 8
+        unpacked[offset : offset + width] |= mask
+        block[...] = np.packbits(unpacked, axis=0, bitorder="little")
+
+    def to_array(self) -> np.ndarray:
+        """Распаковывает всю маску в bool-массив (width, height)."""
+        return self.window(0, 0, self.width, self.height)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        if self.filename:
+            # Маска из файла сохраняется ссылкой на файл, а не содержимым.
+            self.flush()
+            state["bits"] = None
+        else:
+            state["bits"] = np.asarray(self.bits)
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        if self.filename:
+            self.bits = np.memmap(
+                self.filename,
+                dtype=np.uint8,
+                mode="r+",
+                shape=((self.width + 7) // 8, self.height),
+                order="F",
+            )
+
+    def flush(self) -> None:
+        """Сбрасывает изменения на диск, если маска хранится в файле."""
+        if isinstance(self.bits, np.memmap):
+            self.bits.flush()
@@ -2,8 +2,9 @@
 from __future__ import annotations
 
 import random
-from typing import Iterator, List, Tuple, TYPE_CHECKING
+from typing import List, Optional, Tuple, TYPE_CHECKING
 
+import numpy as np  # type: ignore
 import tcod
 
 import entity_factories
@@ -63,31 +64,33 @@ class RectangularRoom:
             and self.y1 <= other.y2
             and self.y2 >= other.y1
         )
-def place_entities(room: RectangularRoom, spaceship: GameMap, floor_number: int,) -> None:
-    number_of_monsters = random.randint(
+def place_entities(
+    room: RectangularRoom, spaceship: GameMap, floor_number: int, rng: random.Random,
+) -> None:
+    number_of_monsters = rng.randint(
         0, get_max_value_for_floor(max_monsters_by_floor, floor_number)
     )
-    number_of_items = random.randint(
+    number_of_items = rng.randint(
         0, get_max_value_for_floor(max_items_by_floor, floor_number)
     )
     number_of_key = 1
 
     for i in range(number_of_monsters):
-        x = random.randint(room.x1 + 1, room.x2 - 1) #рандомно выбирается координата в пределах комнаты, где будет монстр
-        y = random.randint(room.y1 + 1, room.y2 - 1)
+        x = rng.randint(room.x1 + 1, room.x2 - 1) #рандомно выбирается координата в пределах комнаты, где будет монстр
+        y = rng.randint(room.y1 + 1, room.y2 - 1)
 
-        if not any(entity.x == x and entity.y == y for entity in spaceship.entities): #проверяет нет ли там уже монстра
-            if random.random() < 0.7:
+        if spaceship.is_free_for_spawn(x, y): #проверяет нет ли там уже монстра
+            if rng.random() < 0.7:
                 entity_factories.monst1.spawn(spaceship, x, y)
             else:
                 entity_factories.monst2.spawn(spaceship, x, y)
 
     for i in range(number_of_items): 
-        x = random.randint(room.x1 + 1, room.x2 - 1) #рандомно выбирается координата в пределах комнаты, где будет предмет
-        y = random.randint(room.y1 + 1, room.y2 - 1)
+        x = rng.randint(room.x1 + 1, room.x2 - 1) #рандомно выбирается координата в пределах комнаты, где будет предмет
+        y = rng.randint(room.y1 + 1, room.y2 - 1)
 
-        if not any(entity.x == x and entity.y == y for entity in spaceship.entities): #проверяет нет ли там уже предмета
-            item_chance = random.random()
+        if spaceship.is_free_for_spawn(x, y): #проверяет нет ли там уже предмета
+            item_chance = rng.random()
 
             if item_chance < 0.3:
                 entity_factories.space_bomb.spawn(spaceship, x, y)
@@ -100,12 +103,12 @@ def place_entities(room: RectangularRoom, spaceship: GameMap, floor_number: int,
             
 
 def tunnel_between(
-    start: Tuple[int, int], end: Tuple[int, int]
-) -> Iterator[Tuple[int, int]]:
-    """Возвращает L-образный туннель между двумя точками."""
+    start: Tuple[int, int], end: Tuple[int, int], rng: random.Random
+) -> np.ndarray:
+    """Возвращает координаты L-образного туннеля между двумя точками (массив формы (N, 2))."""
     x1, y1 = start 
     x2, y2 = end
-    if random.random() < 0.5:  # 50% шанс.
+    if rng.random() < 0.5:  # 50% шанс.
         #горизонтально, затем вертикально.
         corner_x, corner_y = x2, y1
     else:
@@ -113,10 +116,46 @@ def tunnel_between(
         corner_x, corner_y = x1, y2
 
     # Генерирует координаты туннеля. #линии Бразенхема 
-    for x, y in tcod.los.bresenham((x1, y1), (corner_x, corner_y)).tolist(): 
-        yield x, y  #возвращает "генератор", вместо возвращения значения и выхода из функции
-    for x, y in tcod.los.bresenham((corner_x, corner_y), (x2, y2)).tolist():
-        yield x, y
+    return np.concatenate(
+        [
+            tcod.los.bresenham((x1, y1), (corner_x, corner_y)),
+            tcod.los.bresenham((corner_x, corner_y), (x2, y2)),
+        ]
+    )
+
+def generate_rooms(
+    max_rooms: int,
+    room_min_size: int,
+    room_max_size: int,
+    map_width: int,
+    map_height: int,
+    rng: random.Random,
+) -> List[RectangularRoom]:
+    """Генерирует `max_rooms` кандидатов в комнаты одной пачкой и оставляет непересекающиеся.
+
+    Кандидаты проверяются по порядку, как раньше: комната подходит, если не пересекается
+    ни с одной уже принятой. Вместо попарных RectangularRoom.intersects проверка идет по
+    битовой карте занятых клеток, поэтому ее стоимость не зависит от числа комнат.
+    """
+    np_rng = np.random.default_rng(rng.getrandbits(64))
+    widths = np_rng.integers(room_min_size, room_max_size, size=max_rooms, endpoint=True)
+    heights = np_rng.integers(room_min_size, room_max_size, size=max_rooms, endpoint=True)
+    xs = np_rng.integers(0, map_width - widths - 1, endpoint=True)
+    ys = np_rng.integers(0, map_height - heights - 1, endpoint=True)
+
+    # Клетки, занятые принятыми комнатами вместе со стенами. Комнаты, касающиеся
+    # друг друга стенами, тоже считаются пересекающимися (как в intersects).
+    occupied = np.zeros((map_width, map_height), dtype=bool, order="F")
+    rooms: List[RectangularRoom] = []
+
+    for x, y, width, height in zip(xs.tolist(), ys.tolist(), widths.tolist(), heights.tolist()):
+        area = slice(x, x + width + 1), slice(y, y + height + 1)
+        if occupied[area].any():
+            continue  # Комната накладывается, поэтому она не появляется на карте.
+        occupied[area] = True
+        rooms.append(RectangularRoom(x, y, width, height))
+
+    return rooms
 
 def generate_spaceship(
     max_rooms: int,
@@ -127,56 +166,58 @@ def generate_spaceship(
     engine: Engine,
     floor: int,
     lvl: int,
+    rng: random.Random,
+    explored_file: Optional[str] = None,
  ) -> GameMap:
-    """создает новую карту"""
-    player = engine.player
-    spaceship = GameMap(engine, map_width, map_height, entities=[player]) 
-
-    rooms: List[RectangularRoom] = []
-
-    center_of_last_room = (0, 0)
+    """создает новую карту; вся случайность берется из `rng`, поэтому карта воспроизводима по seed
 
-    for r in range(max_rooms):
-        room_width = random.randint(room_min_size, room_max_size)
-        room_height = random.randint(room_min_size, room_max_size)
+    Игрок на карту не ставится (GameWorld ставит его в upstairs_location при переходе),
+    поэтому функцию можно вызывать в фоновом потоке, пока игрок ходит по текущему этажу.
+    """
+    spaceship = GameMap(engine, map_width, map_height, explored_file=explored_file) 
 
-        x = random.randint(0, spaceship.width - room_width - 1)
-        y = random.randint(0, spaceship.height - room_height - 1)
+    rooms = generate_rooms(
+        max_rooms, room_min_size, room_max_size, map_width, map_height, rng
+    )
 
-        new_room = RectangularRoom(x, y, room_width, room_height)
+    center_of_last_room = (0, 0)
 
-        # Проверяет, не накладываются комнаты друг на друга.
-        if any(new_room.intersects(other_room) for other_room in rooms):
-            continue  # Комната накладывается, поэтому она не появляется на карте.
-        # Если комната не накладывается на другую, то она подходит.
+    # Пол сначала отмечается в булевом массиве и переносится в tiles одним присваиванием:
+    # поклеточная запись структурных плиток намного медленнее.
+    is_floor = np.zeros((map_width, map_height), dtype=bool, order="F")
 
+    for i, new_room in enumerate(rooms):
         # Внутренность комнаты становится полом.
-        spaceship.tiles[new_room.inner] = tile_types.floor
+        is_floor[new_room.inner] = True
 
-        if len(rooms) == 0:
+        if i == 0:
             # первая комната, в которой появится персонаж
-            player.place(*new_room.center, spaceship) 
+            spaceship.upstairs_location = new_room.center
         else:  # все комнаты после первой
             # создает туннель между этой комнатой и предыдущей
-            for x, y in tunnel_between(rooms[-1].center, new_room.center):
-                spaceship.tiles[x, y] = tile_types.floor
+            tunnel = tunnel_between(rooms[i - 1].center, new_room.center, rng)
+            is_floor[tunnel[:, 0], tunnel[:, 1]] = True
 
             center_of_last_room = new_room.center
 
-        place_entities(new_room, spaceship, floor)
+        place_entities(new_room, spaceship, floor, rng)
+
+    spaceship.tiles[is_floor] = tile_types.floor
 
-        if floor < lvl:
-            spaceship.tiles[center_of_last_room] = tile_types.down_stairs
-            spaceship.downstairs_location = center_of_last_room
+    if floor > 1:
+        # лестница наверх - там, где игрок появляется на этаже
+        spaceship.tiles[spaceship.upstairs_location] = tile_types.up_stairs
 
-        # добавляет новую комнату в список
-        rooms.append(new_room)
+    if floor < lvl:
+        # лестница вниз - в центре последней комнаты
+        spaceship.tiles[center_of_last_room] = tile_types.down_stairs
+        spaceship.downstairs_location = center_of_last_room
 
     if floor == lvl:
         room = rooms[-1]
-        x = random.randint(room.x1 + 1, room.x2 - 1) 
-        y = random.randint(room.y1 + 1, room.y2 - 1)
-        if not any(entity.x == x and entity.y == y for entity in spaceship.entities): 
+        x = rng.randint(room.x1 + 1, room.x2 - 1) 
+        y = rng.randint(room.y1 + 1, room.y2 - 1)
+        if spaceship.is_free_for_spawn(x, y): 
             entity_factories.key.spawn(spaceship, x, y)
         else:
             room = rooms[-2]
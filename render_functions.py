@@ -4,6 +4,7 @@ from __future__ import annotations
 from typing import Tuple, TYPE_CHECKING
 
 import color
+import instrumentation
 
 if TYPE_CHECKING:
     from tcod import Console
@@ -15,7 +16,7 @@ def get_names_at_location(x: int, y: int, game_map: GameMap) -> str:
        return ""
 
    names = ", ".join(
-       entity.name for entity in game_map.entities if entity.x == x and entity.y == y
+       entity.name for entity in game_map.get_entities_at_location(x, y)
    )
 
    return names.capitalize()
@@ -70,3 +71,20 @@ def render_help(
     console.print(x=x, y=y+2, string=f"- You can hit a monster just", fg=color.help_mes)
     console.print(x=x, y=y+3, string=f"by walking at it", fg=color.help_mes)
 
+
+def render_profiler(
+    console: Console, location: Tuple[int, int]
+ ) -> None:
+    """
+    Отображает замеры instrumentation поверх карты (оверлей, клавиша F3).
+    """
+    x, y = location
+    lines = instrumentation.overlay_lines() or ["no measurements yet"]
+
+    console.draw_rect(x=x, y=y, width=56, height=len(lines) + 1, ch=ord(" "), bg=color.black)
+    console.print(
+        x=x, y=y, string=f"{'timer (ms) / counter':<26}{'calls':>7} {'last':>7}{'avg':>7}{'max':>8}",
+        fg=color.help_mes,
+    )
+    for i, line in enumerate(lines, start=1):
+        console.print(x=x, y=y + i, string=line, fg=color.white)
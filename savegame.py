@@ -0,0 +1,510 @@
+"""Сохранение и загрузка партии в компактном бинарном формате.
+
+Файл сохранения - архив .npz (np.savez_compressed), в котором для каждого этажа лежат:
+- палитра различных плиток и массив индексов плиток в ней (uint8/uint16 вместо
+  22-байтовой структуры на каждую плитку);
+- visible и explored, упакованные по 1 биту на плитку;
+- объекты карты и предметы из инвентарей - одна таблица со структурным dtype ENTITY_DTYPE;
+- "meta" этажа в JSON: размеры, лестницы, строки из таблицы объектов и параметры предметов.
+Все остальное (настройки мира, журнал сообщений) хранится в массиве "meta" как JSON. Pickle не используется: загрузка сводится
+к распаковке нескольких массивов и np.take по палитре.
+
+Сохранение делится на два шага: snapshot() копирует состояние движка (быстро, в
+основном потоке), а write() кодирует и сжимает копию, поэтому ее можно писать в фоне
+(так работает Autosaver). Покинутые этажи не меняются, пока игрок на них не вернулся,
+а tiles не меняются после генерации: GameWorld один раз кодирует в фоновом потоке
+каждый покинутый этаж и tiles каждого этажа, а snapshot() копирует только объекты,
+visible и explored текущего этажа.
+
+При загрузке собирается только текущий этаж, а покинутые остаются массивами из файла,
+пока игрок на них не вернется (GameWorld вызывает decode_floor).
+"""
+from __future__ import annotations
+
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+import gc
+import json
+import os
+import traceback
+# np.load и np.savez_compressed импортируют zipfile лениво, при первом вызове (~25 мс):
+# пусть это будет при запуске игры, а не при загрузке партии.
+import zipfile
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np  # type: ignore
+
+import components.ai
+import components.consumable
+from components.ai import BaseAI
+from components.base_component import BaseComponent
+from components.fighter import Fighter
+from components.inventory import Inventory
+from engine import Engine
+from entity import Actor, Entity, Item
+from game_map import GameMap, GameWorld
+from message_log import Message
+from render_order import RenderOrder
+
+SAVE_VERSION = 3
+
+ENTITY_DTYPE = np.dtype(
+    [
+        ("is_actor", bool),
+        ("owner", np.int32),  # строка владельца для предметов в инвентаре, -1 - на карте
+        ("x", np.int32),
+        ("y", np.int32),
+        ("char", np.int32),  # код символа
+        ("color", np.uint8, 3),
+        ("name", np.int32),  # индекс в таблице строк
+        ("blocks_movement", bool),
+        ("render_order", np.uint8),
+        # Actor:
+        ("ai", np.int32),  # имя класса AI в таблице строк, -1 - нет AI (мертв)
+        ("hp", np.int32),
+        ("max_hp", np.int32),
+        ("defense", np.int32),
+        ("power", np.int32),
+        ("last_damage_source", np.int32),  # строки, -1 - None
+        ("cause_of_death", np.int32),
+        ("capacity", np.int32),
+        # Item:
+        ("consumable", np.int32),  # имя класса Consumable в таблице строк
+        ("params", np.int32),  # индекс полей AI или Consumable в params этажа, -1 - нет
+    ]
+)
+
+Snapshot = Dict[str, Any]
+"""Копия состояния движка: уже закодированный в JSON "meta", массивы текущего этажа
+("arrays", без tiles), а также Future с массивами покинутых этажей ("floors") и с
+палитрами и индексами tiles всех этажей ("tiles").
+
+Снимок не ссылается на изменяемые объекты игры, поэтому его можно писать в другом потоке.
+"""
+
+
+class StringTable:
+    """Таблица строк: в таблицу объектов попадают индексы, а сами строки - в meta."""
+
+    def __init__(self, strings: Optional[List[str]] = None):
+        self.strings: List[str] = strings or []
+        self._indices = {string: i for i, string in enumerate(self.strings)}
+
+    def add(self, string: Optional[str]) -> int:
+        if string is None:
+            return -1
+        index = self._indices.get(string)
+        if index is None:
+            index = self._indices[string] = len(self.strings)
+            self.strings.append(string)
+        return index
+
+    def get(self, index: int) -> Optional[str]:
+        return None if index < 0 else self.strings[index]
+
+
+def component_params(component: BaseComponent) -> Dict[str, Any]:
+    """Аргументы конструктора компонента (все его поля из __slots__, кроме parent)."""
+    return {
+        name: getattr(component, name)
+        for cls in type(component).__mro__
+        for name in getattr(cls, "__slots__", ())
+        if name != "parent"
+    }
+
+
+def ai_params(ai: BaseAI) -> Dict[str, Any]:
+    """Состояние AI (например, запомненный путь), кроме самого объекта."""
+    return {name: value for name, value in vars(ai).items() if name != "entity"}
+
+
+def encode_entities(
+    entities: List[Entity], strings: StringTable, params: List[Dict[str, Any]]
+) -> np.ndarray:
+    """Складывает объекты карты и их инвентари в таблицу ENTITY_DTYPE.
+
+    Предметы инвентаря идут сразу после владельца в том же порядке, что и в инвентаре.
+    """
+    rows: List[Tuple[Any, ...]] = []
+
+    def add(entity: Entity, owner: int) -> None:
+        row = len(rows)
+        common = (
+            entity.x,
+            entity.y,
+            ord(entity.char),
+            entity.color,
+            strings.add(entity.name),
+            entity.blocks_movement,
+            entity.render_order.value,
+        )
+        if isinstance(entity, Actor):
+            fighter = entity.fighter
+            if entity.ai:
+                params.append(ai_params(entity.ai))
+            rows.append(
+                (True, owner)
+                + common
+                + (
+                    strings.add(type(entity.ai).__name__) if entity.ai else -1,
+                    fighter.hp,
+                    fighter.max_hp,
+                    fighter.defense,
+                    fighter.power,
+                    strings.add(fighter.last_damage_source),
+                    strings.add(fighter.cause_of_death),
+                    entity.inventory.capacity,
+                    -1,
+                    len(params) - 1 if entity.ai else -1,
+                )
+            )
+            for item in entity.inventory.items:
+                add(item, row)
+        elif isinstance(entity, Item):
+            rows.append(
+                (False, owner)
+                + common
+                + (-1, 0, 0, 0, 0, -1, -1, 0)
+                + (strings.add(type(entity.consumable).__name__), len(params))
+            )
+            params.append(component_params(entity.consumable))
+        else:
+            raise TypeError(f"Cannot save {entity!r}.")
+
+    for entity in entities:
+        add(entity, -1)
+    return np.array(rows, dtype=ENTITY_DTYPE)
+
+
+def decode_entities(
+    table: np.ndarray, strings: StringTable, params: List[Dict[str, Any]], game_map: GameMap
+) -> List[Entity]:
+    """Создает объекты из таблицы ENTITY_DTYPE и раскладывает их по карте и инвентарям.
+
+    Actor, Item и AI восстанавливаются так же, как их восстанавливает pickle: через
+    __new__ и запись полей, без конструкторов. Все их поля есть в таблице и params,
+    а цепочки конструкторов на тысячах объектов заметно замедляют загрузку.
+    """
+    render_orders = {order.value: order for order in RenderOrder}
+    names = strings.strings
+    classes: Dict[int, type] = {}  # индекс имени класса -> класс AI или Consumable
+    entities: List[Entity] = []
+    on_map: List[Entity] = []
+    # Столбцы по отдельности: tolist() по строкам втрое медленнее и отдает color как ndarray.
+    columns = [table[name].tolist() for name in ENTITY_DTYPE.names]
+    for (
+        is_actor, owner, x, y, char, color, name, blocks_movement, render_order,
+        ai, hp, max_hp, defense, power, last_damage_source, cause_of_death, capacity,
+        consumable, params_index,
+    ) in zip(*columns):
+        entity: Entity
+        if is_actor:
+            entity = Actor.__new__(Actor)
+            entity.fighter = Fighter(hp=max_hp, defense=defense, power=power)
+            entity.fighter.parent = entity
+            entity.fighter._hp = hp  # Без сеттера: объект еще не на карте, die() не нужен.
+            entity.fighter.last_damage_source = strings.get(last_damage_source)
+            entity.fighter.cause_of_death = strings.get(cause_of_death)
+            entity.inventory = Inventory(capacity=capacity)
+            entity.inventory.parent = entity
+            if ai < 0:
+                entity.ai = None
+            else:
+                if ai not in classes:
+                    classes[ai] = getattr(components.ai, strings.get(ai))
+                entity.ai = classes[ai].__new__(classes[ai])
+                vars(entity.ai).update(params[params_index], entity=entity)
+        else:
+            if consumable not in classes:
+                classes[consumable] = getattr(components.consumable, strings.get(consumable))
+            entity = Item.__new__(Item)
+            entity.consumable = classes[consumable](**params[params_index])
+            entity.consumable.parent = entity
+        entity.x = x
+        entity.y = y
+        entity.char = chr(char)
+        entity.color = tuple(color)
+        entity.name = names[name]
+        entity.blocks_movement = blocks_movement
+        entity.render_order = render_orders[render_order]
+        entity.entity_id = 0  # Объектам на карте id выдаст add_entities.
+
+        if owner < 0:
+            entity.parent = game_map
+            on_map.append(entity)
+        else:
+            inventory = entities[owner].inventory
+            entity.parent = inventory
+            inventory.items.append(entity)
+        entities.append(entity)
+    game_map.add_entities(on_map)
+    return entities
+
+
+def encode_tiles(tiles: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Раскладывает tiles на палитру различных плиток и массив индексов в ней.
+
+    np.unique по структурным плиткам очень медленный, поэтому плитки сначала
+    хешируются по байтам, а палитра собирается по хешам (их обычно несколько штук).
+    """
+    flat = np.ascontiguousarray(tiles.T).reshape(-1)  # tiles в порядке F: tiles.T непрерывен
+    word = np.uint16 if tiles.dtype.itemsize % 2 == 0 else np.uint8
+    words = flat.view(word).reshape(flat.size, -1)
+    keys = np.zeros(flat.size, dtype=np.uint64)
+    for column in words.T:
+        keys = keys * np.uint64(0x100000001B3) ^ column  # FNV-подобный хеш
+
+    index = np.zeros(flat.size, dtype=np.uint16)
+    palette = []
+    unassigned = np.ones(flat.size, dtype=bool)
+    while unassigned.any():
+        first = unassigned.argmax()
+        same = keys == keys[first]
+        index[same] = len(palette)
+        palette.append(flat[first])
+        unassigned &= ~same
+    palette_array = np.array(palette, dtype=tiles.dtype)
+
+    if not np.array_equal(np.take(palette_array, index).view(word), flat.view(word)):
+        # Коллизия хешей - собираем палитру медленно, но точно.
+        unique, inverse = np.unique(
+            flat.view(np.dtype((np.void, tiles.dtype.itemsize))), return_inverse=True
+        )
+        palette_array, index = unique.view(tiles.dtype), inverse.astype(np.uint16)
+
+    if len(palette_array) <= 256:
+        index = index.astype(np.uint8)
+    return palette_array, index.reshape(tiles.shape[::-1]).T
+
+
+def decode_tiles(palette: np.ndarray, index: np.ndarray) -> np.ndarray:
+    """Собирает tiles (в порядке F) из палитры и индексов.
+
+    Палитра берется как плитки-байтовые строки (np.void): так np.take копирует
+    целые плитки и заметно быстрее, чем по структурному dtype.
+    """
+    raw = palette.view(np.dtype((np.void, palette.dtype.itemsize)))
+    return np.take(raw, index.T).T.view(palette.dtype)
+
+
+def snapshot_map(game_map: GameMap, floor: int) -> Dict[str, np.ndarray]:
+    """Копирует этаж в массивы, в том числе его "meta"; tiles кодирует GameWorld.tiles_encoding."""
+    strings = StringTable()
+    params: List[Dict[str, Any]] = []
+    entities = encode_entities(list(game_map.ordered_entities), strings, params)
+    info = {
+        "width": game_map.width,
+        "height": game_map.height,
+        "downstairs_location": game_map.downstairs_location,
+        "upstairs_location": game_map.upstairs_location,
+        "strings": strings.strings,
+        "params": params,
+    }
+    return {
+        f"floor{floor}_meta": np.frombuffer(json.dumps(info).encode("utf-8"), dtype=np.uint8),
+        f"floor{floor}_visible": np.packbits(game_map.visible, axis=0, bitorder="little"),
+        f"floor{floor}_explored": np.array(game_map.explored.bits),
+        f"floor{floor}_entities": entities,
+    }
+
+
+def snapshot(engine: Engine) -> Snapshot:
+    """Копирует все состояние партии, которое нужно для write()."""
+    world = engine.game_world
+    floors = world.floor_snapshots()
+    arrays = snapshot_map(engine.game_map, world.current_floor)
+    tiles = {floor: world.tiles_encoding(floor) for floor in list(floors) + [world.current_floor]}
+
+    player_row = list(engine.game_map.ordered_entities).index(engine.player)
+    meta = {
+        "version": SAVE_VERSION,
+        "world": {
+            "map_width": world.map_width,
+            "map_height": world.map_height,
+            "max_rooms": world.max_rooms,
+            "room_min_size": world.room_min_size,
+            "room_max_size": world.room_max_size,
+            "current_floor": world.current_floor,
+            "lvl": world.lvl,
+            "seed": world.seed,
+            "pregenerate": world.pregenerate,
+            "explored_dir": world.explored_dir,
+            "max_cached_floors": world.max_cached_floors,
+        },
+        # Инвентарь игрока идет в таблице сразу после него, поэтому игрок находится
+        # по номеру среди объектов, лежащих на карте.
+        "player": player_row,
+        "kill_count": engine.kill_count,
+        "messages": [
+            [message.plain_text, message.fg, message.count]
+            for message in engine.message_log.messages
+        ],
+        # Текущий этаж идет последним, чтобы покинутые этажи попали в кэш в прежнем порядке.
+        "floors": list(floors) + [world.current_floor],
+    }
+    return {
+        "meta": json.dumps(meta).encode("utf-8"),
+        "arrays": arrays,
+        "floors": floors,
+        "tiles": tiles,
+    }
+
+
+def write(state: Snapshot, filename: str) -> None:
+    """Собирает закодированные этажи снимка, сжимает их и пишет в файл `filename`.
+
+    Если фоновое кодирование этажей еще идет, write() его дожидается. Запись идет
+    во временный файл, который затем заменяет `filename` (os.replace), поэтому файл
+    сохранения никогда не бывает записан наполовину.
+    """
+    arrays = dict(state["arrays"])
+    for floor_arrays in state["floors"].values():
+        arrays.update(floor_arrays.result())
+    for floor, encoding in state["tiles"].items():
+        arrays[f"floor{floor}_palette"], arrays[f"floor{floor}_tiles"] = encoding.result()
+    arrays["meta"] = np.frombuffer(state["meta"], dtype=np.uint8)
+    temp_filename = f"{filename}.tmp"
+    with open(temp_filename, "wb") as f:
+        np.savez_compressed(f, **arrays)
+    os.replace(temp_filename, filename)
+
+
+def save(engine: Engine, filename: str) -> None:
+    write(snapshot(engine), filename)
+
+
+@contextmanager
+def _gc_paused() -> Iterator[None]:
+    # Пока создаются тысячи объектов, сборщик циклов раз за разом обходил бы их все.
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def load(filename: str) -> Engine:
+    """Загружает партию из файла, записанного save()."""
+    with _gc_paused():
+        return _load(filename)
+
+
+def decode_floor(
+    engine: Engine, floor: int, arrays: Dict[str, np.ndarray], tiles: Tuple[np.ndarray, np.ndarray]
+) -> GameMap:
+    """Собирает этаж `floor` из его массивов в файле сохранения и палитры с индексами tiles."""
+    prefix = f"floor{floor}_"
+    info = json.loads(arrays[prefix + "meta"].tobytes().decode("utf-8"))
+    width, height = info["width"], info["height"]
+    with _gc_paused():
+        game_map = GameMap(
+            engine,
+            width,
+            height,
+            explored_file=engine.game_world.explored_file(floor),
+            tiles=decode_tiles(*tiles),
+        )
+        game_map.visible[...] = np.unpackbits(
+            arrays[prefix + "visible"], axis=0, count=width, bitorder="little"
+        ).view(bool)
+        game_map.explored.bits[...] = arrays[prefix + "explored"]
+        game_map.downstairs_location = tuple(info["downstairs_location"])
+        game_map.upstairs_location = tuple(info["upstairs_location"])
+        decode_entities(
+            arrays[prefix + "entities"], StringTable(info["strings"]), info["params"], game_map
+        )
+    return game_map
+
+
+def _load(filename: str) -> Engine:
+    with np.load(filename) as data:
+        meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+        if meta["version"] != SAVE_VERSION:
+            raise ValueError(f"Unsupported save version {meta['version']}.")
+        settings = meta["world"]
+
+        engine = Engine(player=None)  # type: ignore  # Игрок будет найден среди объектов.
+        engine.kill_count = meta["kill_count"]
+        for text, fg, count in meta["messages"]:
+            message = Message(text, tuple(fg))
+            message.count = count
+            engine.message_log.messages.append(message)
+
+        world = GameWorld(engine=engine, **settings)
+        engine.game_world = world
+
+        visited = []
+        tiles = {}
+        for floor in meta["floors"]:
+            prefix = f"floor{floor}_"
+            tiles[floor] = (data[prefix + "palette"], data[prefix + "tiles"])
+            # Массивы покинутых этажей GameWorld хранит как есть и для следующих сохранений.
+            arrays = {
+                name: data[name]
+                for name in data.files
+                if name.startswith(prefix) and name not in (prefix + "palette", prefix + "tiles")
+            }
+            visited.append((floor, arrays))
+
+    floor, arrays = visited.pop()
+    engine.game_map = decode_floor(engine, floor, arrays, tiles[floor])
+    engine.player = list(engine.game_map.ordered_entities)[meta["player"]]
+    world.restore_floors(visited, tiles)
+    return engine
+
+
+# Один фоновый поток на все автосохранения: записи идут строго по очереди.
+_autosave_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="autosave")
+
+
+class Autosaver:
+    """Автосохранение партии каждые `interval` ходов и по запросу (например, на лестнице).
+
+    В основном потоке снимается только snapshot(), а кодирование, сжатие и запись
+    на диск идут в фоновом потоке, так что игра не подтормаживает.
+    """
+
+    def __init__(self, engine: Engine, filename: str, interval: int = 20):
+        self.engine = engine
+        self.filename = filename
+        self.interval = interval
+        self.turns_since_save = 0
+        self.save_requested = False
+        self._pending: Optional[Future] = None
+
+    def request_save(self) -> None:
+        """Просит сохранить партию в конце текущего хода."""
+        self.save_requested = True
+
+    def end_turn(self) -> None:
+        """Вызывается в конце хода; сохраняет, если пора или если сохранение запрошено."""
+        self.turns_since_save += 1
+        if self.save_requested or self.turns_since_save >= self.interval:
+            self.save()
+
+    def save(self) -> None:
+        """Снимает снимок партии и отдает его на запись в фоновый поток."""
+        if not self.engine.player.is_alive:
+            return  # Погибшего героя не сохраняем.
+        self.turns_since_save = 0
+        self.save_requested = False
+        state = snapshot(self.engine)
+        if self._pending is not None:
+            # Если предыдущая запись еще не началась, она уже не нужна.
+            self._pending.cancel()
+        self._pending = _autosave_executor.submit(write, state, self.filename)
+        self._pending.add_done_callback(self._report_error)
+
+    @staticmethod
+    def _report_error(future: Future) -> None:
+        """Ошибка фоновой записи не должна пропасть молча: выводит ее в stderr."""
+        if not future.cancelled() and future.exception() is not None:
+            traceback.print_exception(future.exception())
+
+    def wait(self) -> None:
+        """Дожидается окончания начатой записи (например, перед выходом из игры)."""
+        if self._pending is not None:
+            wait([self._pending])
+            self._pending = None
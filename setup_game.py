@@ -1,7 +1,7 @@
 """Handle the loading and initialization of game sessions."""
 from __future__ import annotations
 
-import copy
+import traceback
 from typing import Optional
 
 import tcod
@@ -11,21 +11,31 @@ from engine import Engine
 import entity_factories
 from game_map import GameWorld
 import input_handlers
+import savegame
 
 
 background_image = tcod.image.load("menu_background.png")[:, :, :3]
 
 
-def new_game(lvl: int) -> Engine:
-    """Return a brand new game session as an Engine instance."""
-    map_width = 100
-    map_height = 46
-
+def new_game(
+    lvl: int,
+    seed: Optional[int] = None,
+    map_width: int = 100,
+    map_height: int = 46,
+    pregenerate: bool = True,
+) -> Engine:
+    """Return a brand new game session as an Engine instance.
+
+    Одинаковый `seed` дает одинаковые этажи; без seed он выбирается случайно.
+    Карта может быть больше экрана (камера следует за героем); число комнат
+    растет пропорционально площади, чтобы корабль не был пустым.
+    `pregenerate` - строить ли следующий этаж заранее в фоновом потоке (см. GameWorld).
+    """
     room_max_size = 16
     room_min_size = 9
-    max_rooms = 60
+    max_rooms = max(60, 60 * map_width * map_height // (100 * 46))
 
-    player = copy.deepcopy(entity_factories.player)
+    player = entity_factories.player.clone()
 
     engine = Engine(player=player)
 
@@ -36,7 +46,9 @@ def new_game(lvl: int) -> Engine:
         room_max_size=room_max_size,
         map_width=map_width,
         map_height=map_height,
-        lvl=lvl
+        lvl=lvl,
+        seed=seed,
+        pregenerate=pregenerate,
     )
 
     engine.game_world.generate_floor()
@@ -48,6 +60,11 @@ def new_game(lvl: int) -> Engine:
     return engine
 
 
+def load_game(filename: str) -> Engine:
+    """Загружает партию из файла сохранения."""
+    return savegame.load(filename)
+
+
 class MainMenu(input_handlers.BaseEventHandler):
     """Обрабатывает рендеринг меню и инпут."""
 
@@ -99,7 +116,8 @@ class MainMenu(input_handlers.BaseEventHandler):
             )
 
         for i, text in enumerate(
-            ["    [3] Easy",
+            ["    [C] Continue",
+             "    [3] Easy",
              "    [5] Normal",
              "    [8] Hard",
             ]
@@ -120,7 +138,7 @@ class MainMenu(input_handlers.BaseEventHandler):
         ):
             console.print(
                 console.width // 2,
-                41 + i,
+                42 + i,
                 text.ljust(menu_width),
                 fg=(196, 0, 0),
                 bg=color.black,
@@ -128,16 +146,29 @@ class MainMenu(input_handlers.BaseEventHandler):
                 bg_blend=tcod.BKGND_ALPHA(64),
             )
 
+    def play(self, engine: Engine) -> input_handlers.BaseEventHandler:
+        """Начинает партию с автосохранением в savegame.sav."""
+        engine.autosaver = savegame.Autosaver(engine, "savegame.sav")
+        return input_handlers.MainGameEventHandler(engine)
+
     def ev_keydown(
         self, event: tcod.event.KeyDown
     ) -> Optional[input_handlers.BaseEventHandler]:
         if event.sym in (tcod.event.K_q, tcod.event.K_ESCAPE):
             raise SystemExit()
+        elif event.sym == tcod.event.K_c:
+            try:
+                return self.play(load_game("savegame.sav"))
+            except FileNotFoundError:
+                return input_handlers.PopupMessage(self, "No saved game to load.")
+            except Exception as exc:
+                traceback.print_exc()  # Выводит ошибку в stderr.
+                return input_handlers.PopupMessage(self, f"Failed to load save:\n{exc}")
         elif event.sym == tcod.event.K_3:
-            return input_handlers.MainGameEventHandler(new_game(3))
+            return self.play(new_game(3))
         elif event.sym == tcod.event.K_5:
-            return input_handlers.MainGameEventHandler(new_game(5))
+            return self.play(new_game(5))
         elif event.sym == tcod.event.K_8:
-            return input_handlers.MainGameEventHandler(new_game(8))
+            return self.play(new_game(8))
 
         return None
\ No newline at end of file
@@ -0,0 +1,318 @@
+"""Безоконный (headless) режим: прогон партий без tcod.context и input_handlers.
+
+Нужен для проверки баланса и регрессий procgen/AI: движок создается через
+setup_game.new_game, а игроком управляет стратегия (policy), которая по состоянию
+движка возвращает обычные действия из actions.
+
+Пример запуска: python simulation.py --games 1000 --lvl 3 --policy bot --workers 8
+"""
+from __future__ import annotations
+
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import random
+import time
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Optional, Tuple, TYPE_CHECKING
+
+import tcod
+
+from actions import Action, BumpAction, ItemAction, PickupAction, TakeStairsAction
+from components.consumable import GunDamageConsumable, HealingConsumable
+from engine import Engine
+from entity import Item
+import exceptions
+import instrumentation
+from setup_game import new_game
+
+if TYPE_CHECKING:
+    from entity import Actor
+
+Policy = Callable[[Engine], Optional[Action]]
+"""Стратегия игрока: возвращает следующее действие игрока или None, чтобы закончить партию."""
+
+DIRECTIONS: List[Tuple[int, int]] = [
+    (dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if dx or dy
+]
+
+
+class GameResult(NamedTuple):
+    """Итог одной безоконной партии."""
+    seed: int  # seed мира: new_game(lvl, seed) воспроизводит те же этажи
+    lvl: int  # количество этажей (уровень сложности)
+    floor: int  # этаж, до которого дошел игрок
+    turns: int  # количество совершенных ходов
+    won: bool  # True, если игрок подобрал ключ
+    alive: bool
+    kills: int
+    death_cause: Optional[str]  # кто убил игрока (из Fighter.die), None если игрок жив
+
+
+class RandomPolicy:
+    """Случайный игрок: пользуется лестницей и подбирает предметы, иначе идет в случайную сторону."""
+
+    def __init__(self, seed: Optional[int] = None):
+        self.rng = random.Random(seed)
+
+    def __call__(self, engine: Engine) -> Optional[Action]:
+        player = engine.player
+        game_map = engine.game_map
+        if (player.x, player.y) == game_map.downstairs_location:
+            return TakeStairsAction(player)
+        inventory = player.inventory
+        if len(inventory.items) < inventory.capacity and any(
+            isinstance(entity, Item) for entity in game_map.get_entities_at_location(player.x, player.y)
+        ):
+            return PickupAction(player)
+        return BumpAction(player, *self.rng.choice(DIRECTIONS))
+
+
+class ScriptedPolicy:
+    """Игрок по сценарию: по очереди выполняет заданные действия, затем заканчивает партию.
+
+    Каждый шаг сценария - функция, которая по игроку создает действие,
+    например `lambda player: BumpAction(player, 1, 0)`.
+    """
+
+    def __init__(self, steps: Iterable[Callable[[Actor], Action]]):
+        self.steps = iter(steps)
+
+    def __call__(self, engine: Engine) -> Optional[Action]:
+        step = next(self.steps, None)
+        if step is None:
+            return None
+        return step(engine.player)
+
+
+class BotPolicy:
+    """Встроенный бот для тестов баланса.
+
+    Бьет соседних врагов, лечится при низком здоровье, стреляет из космического
+    ружья по видимым врагам, собирает видимые предметы, а затем идет к лестнице
+    (на последнем этаже - к ключу). Расположение лестницы и ключа бот знает заранее.
+    """
+
+    def __init__(self, seed: Optional[int] = None, heal_below: float = 0.4):
+        self.rng = random.Random(seed)
+        self.heal_below = heal_below
+
+    def __call__(self, engine: Engine) -> Optional[Action]:
+        player = engine.player
+        game_map = engine.game_map
+        fighter = player.fighter
+        items = player.inventory.items
+
+        for dx, dy in DIRECTIONS:
+            if game_map.get_actor_at_location(player.x + dx, player.y + dy):
+                return BumpAction(player, dx, dy)
+
+        if fighter.hp < fighter.max_hp * self.heal_below:
+            for item in items:
+                if isinstance(item.consumable, HealingConsumable):
+                    return ItemAction(player, item)
+
+        for item in items:
+            if isinstance(item.consumable, GunDamageConsumable) and game_map.get_nearest_actor(
+                player.x, player.y, item.consumable.maximum_range, exclude=player
+            ):
+                return ItemAction(player, item)
+
+        if len(items) < player.inventory.capacity and any(
+            isinstance(entity, Item) for entity in game_map.get_entities_at_location(player.x, player.y)
+        ):
+            return PickupAction(player)
+
+        if (player.x, player.y) == game_map.downstairs_location:
+            return TakeStairsAction(player)
+
+        for target_x, target_y in self.targets(engine):
+            step = self.first_step_to(engine, target_x, target_y)
+            if step:
+                return BumpAction(player, step[0] - player.x, step[1] - player.y)
+
+        return BumpAction(player, *self.rng.choice(DIRECTIONS))
+
+    def targets(self, engine: Engine) -> List[Tuple[int, int]]:
+        """Цели бота по порядку: видимые предметы, ключ, лестница вниз."""
+        game_map = engine.game_map
+        targets = [
+            (item.x, item.y) for item in game_map.items if game_map.visible[item.x, item.y]
+        ]
+        targets.extend((item.x, item.y) for item in game_map.items if item.name == "Key")
+        if engine.game_world.current_floor < engine.game_world.lvl:
+            targets.append(game_map.downstairs_location)
+        return targets
+
+    @staticmethod
+    def first_step_to(engine: Engine, x: int, y: int) -> Optional[Tuple[int, int]]:
+        """Возвращает первую плитку кратчайшего пути игрока к (x, y) или None, если пути нет."""
+        player = engine.player
+        pathfinder = tcod.path.Pathfinder(
+            tcod.path.SimpleGraph(cost=engine.game_map.cost, cardinal=2, diagonal=3)
+        )
+        pathfinder.add_root((player.x, player.y))
+        path = pathfinder.path_to((x, y)).tolist()
+        if len(path) < 2:
+            return None
+        return path[1][0], path[1][1]
+
+
+def has_won(engine: Engine) -> bool:
+    """Возвращает True, если у игрока в инвентаре лежит ключ от корабля."""
+    return any(item.name == "Key" for item in engine.player.inventory.items)
+
+
+def play_turn(engine: Engine, action: Action) -> bool:
+    """Выполняет действие игрока и ход врагов, как EventHandler.handle_action.
+
+    Возвращает True, если действие продвинуло ход.
+    """
+    try:
+        with instrumentation.timer("action.perform"):
+            action.perform()
+    except exceptions.Impossible:
+        return False  # Невозможное действие не тратит ход.
+
+    instrumentation.count("turns")
+    engine.handle_enemy_turns()
+    engine.update_fov()
+    return True
+
+
+def run_game(
+    lvl: int, policy: Policy, max_turns: int = 1000, seed: Optional[int] = None
+) -> GameResult:
+    """Играет одну партию до смерти игрока, победы, конца сценария или лимита ходов."""
+    # Без окна ждать этаж некому, а большинство партий до него не доходит:
+    # фоновая генерация только отнимала бы GIL у самой партии.
+    engine = new_game(lvl, seed, pregenerate=False)
+    turns = 0
+    # Невозможные действия не тратят ход, поэтому попытки тоже ограничены.
+    for _ in range(max_turns * 10):
+        if turns >= max_turns or not engine.player.is_alive or has_won(engine):
+            break
+        action = policy(engine)
+        if action is None:
+            break
+        if play_turn(engine, action):
+            turns += 1
+
+    return GameResult(
+        seed=engine.game_world.seed,
+        lvl=lvl,
+        floor=engine.game_world.current_floor,
+        turns=turns,
+        won=has_won(engine),
+        alive=engine.player.is_alive,
+        kills=engine.kill_count,
+        death_cause=engine.player.fighter.cause_of_death,
+    )
+
+
+def run_games(
+    lvl: int,
+    games: int,
+    policy_factory: Callable[[int], Policy] = RandomPolicy,
+    max_turns: int = 1000,
+    seed: Optional[int] = None,
+) -> Iterator[GameResult]:
+    """Последовательно играет `games` партий; стратегия для партии i создается как policy_factory(i).
+
+    Если задан `seed`, партия i играется с seed + i, и весь прогон воспроизводим.
+    """
+    for i in range(games):
+        yield run_game(lvl, policy_factory(i), max_turns, game_seed(seed, i))
+
+
+def game_seed(seed: Optional[int], index: int) -> Optional[int]:
+    """seed партии с номером `index` в прогоне с общим `seed`."""
+    return None if seed is None else seed + index
+
+
+def _run_game_task(
+    lvl: int,
+    policy_factory: Callable[[int], Policy],
+    index: int,
+    max_turns: int,
+    seed: Optional[int],
+) -> GameResult:
+    """Точка входа рабочего процесса (должна быть функцией уровня модуля для pickle)."""
+    return run_game(lvl, policy_factory(index), max_turns, game_seed(seed, index))
+
+
+def run_games_parallel(
+    lvl: int,
+    games: int,
+    policy_factory: Callable[[int], Policy] = BotPolicy,
+    max_turns: int = 1000,
+    workers: Optional[int] = None,
+    seed: Optional[int] = None,
+) -> Iterator[GameResult]:
+    """Играет `games` партий в пуле процессов и отдает результаты по мере готовности.
+
+    `workers` - число процессов (по умолчанию по числу ядер).
+    `policy_factory` должна сериализоваться через pickle (класс или функция уровня модуля).
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_run_game_task, lvl, policy_factory, i, max_turns, seed)
+            for i in range(games)
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def print_summary(results: List[GameResult], elapsed: float) -> None:
+    """Печатает сводку по сыгранным партиям."""
+    games = len(results)
+    print(f"games: {games} in {elapsed:.2f}s ({games / elapsed * 60:.0f} games/min)")
+    print(f"won: {sum(result.won for result in results)}")
+    print(f"died: {sum(not result.alive for result in results)}")
+    print(f"average floor: {sum(result.floor for result in results) / games:.2f}")
+    print(f"average turns: {sum(result.turns for result in results) / games:.1f}")
+    print(f"average kills: {sum(result.kills for result in results) / games:.2f}")
+
+    floors = Counter(result.floor for result in results)
+    print("floors reached: " + ", ".join(f"{floor}: {floors[floor]}" for floor in sorted(floors)))
+    causes = Counter(result.death_cause for result in results if result.death_cause)
+    for cause, count in causes.most_common():
+        print(f"killed by {cause}: {count}")
+
+
+POLICIES = {"random": RandomPolicy, "bot": BotPolicy}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Headless batch runner for Spaceship Defender.")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--lvl", type=int, default=3)
+    parser.add_argument("--max-turns", type=int, default=1000)
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="random")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the first game")
+    parser.add_argument(
+        "--workers", type=int, default=1, help="number of processes (0 - one per core)"
+    )
+    args = parser.parse_args()
+    policy_factory = POLICIES[args.policy]
+
+    start = time.perf_counter()
+    if args.workers == 1:
+        results = list(
+            run_games(args.lvl, args.games, policy_factory, args.max_turns, args.seed)
+        )
+    else:
+        results = []
+        for result in run_games_parallel(
+            args.lvl, args.games, policy_factory, args.max_turns, args.workers or None, args.seed
+        ):
+            results.append(result)
+            print(
+                f"game {len(results)}/{args.games} (seed {result.seed}): floor {result.floor}, "
+                f"turns {result.turns}, kills {result.kills}, "
+                f"{'won' if result.won else result.death_cause or 'alive'}"
+            )
+    print_summary(results, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
@@ -62,4 +62,11 @@ down_stairs = new_tile(
    light=(ord(">"), (255, 255, 255), (200, 180, 50)),
 )
 
+up_stairs = new_tile(
+   walkable=True,
+   transparent=True,
+   dark=(ord("<"), (0, 0, 100), (50, 50, 150)),
+   light=(ord("<"), (255, 255, 255), (200, 180, 50)),
+)
+
 